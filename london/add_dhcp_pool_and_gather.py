@@ -12,14 +12,20 @@ ip dhcp pool GUEST
 Then run: show running-config | section ip dhcp pool GUEST
 Collect per-host outputs and append into a combined file in the script folder.
 
-Options: --dry-run, --debug, --out combined filename
+Options: --dry-run, --debug, --out combined filename, --resume RUN_ID
+
+Every host's result goes to a run journal (journal.py). If a run is cut short,
+--resume <run id> (printed at the start of the run) rebuilds the combined file
+from the hosts already done and only configures the rest. Dry runs are not
+journaled.
 """
 
 import argparse
-import time
 from pathlib import Path
 from cryptography.fernet import Fernet
 import paramiko
+from ssh_session import learn_prompt, send_command
+from journal import RunJournal
 
 
 def load_creds(base: Path):
@@ -71,39 +77,14 @@ def run_on_host(ip, name, user, pwd, dry_run=False, debug=False):
         client.connect(hostname=ip, username=user, password=pwd, look_for_keys=False, allow_agent=False, timeout=10)
         shell = client.invoke_shell()
         shell.settimeout(2)
-        time.sleep(1)
-        try:
-            shell.recv(65535)
-        except Exception:
-            pass
+        _, prompt = learn_prompt(shell)
         # Enter enable/config mode. Assumes user has priv. If enable password needed, you'd send 'enable' and the pw.
-        shell.send('configure terminal\n')
-        time.sleep(0.5)
-        shell.send('ip dhcp pool GUEST\n')
-        time.sleep(0.2)
-        shell.send(' vrf GUEST\n')
-        time.sleep(0.2)
-        shell.send(' lease 0 4\n')
-        time.sleep(0.2)
-        shell.send('end\n')
-        time.sleep(0.5)
+        # Each line waits for the (config)#/(dhcp-config)# prompt before the next is sent.
+        for line in ('configure terminal', 'ip dhcp pool GUEST', ' vrf GUEST', ' lease 0 4', 'end'):
+            send_command(shell, line, prompt)
         # Run show
-        shell.send('terminal length 0\n')
-        time.sleep(0.2)
-        shell.send('show running-config | section ip dhcp pool GUEST\n')
-        out = ''
-        prompt_patterns = ['#', '>']
-        for _ in range(120):
-            time.sleep(0.5)
-            try:
-                chunk = shell.recv(65535).decode('utf-8', errors='ignore')
-            except Exception:
-                break
-            out += chunk
-            if '--More--' in chunk:
-                shell.send(' ')
-            if any(chunk.strip().endswith(p) for p in prompt_patterns):
-                break
+        send_command(shell, 'terminal length 0', prompt)
+        out, _ = send_command(shell, 'show running-config | section ip dhcp pool GUEST', prompt)
         return (True, out)
     except Exception as e:
         print(f"Failed {name}: {e}")
@@ -120,6 +101,7 @@ def main():
     parser.add_argument('--dry-run', action='store_true')
     parser.add_argument('--debug', action='store_true')
     parser.add_argument('--out', default='combined_dhcp_pool_GUEST.txt')
+    parser.add_argument('--resume', metavar='RUN_ID', help='Finish an interrupted run: skip hosts already configured')
     args = parser.parse_args()
 
     base = Path(__file__).parent
@@ -128,17 +110,38 @@ def main():
         print('Missing device_user/device_pass')
         raise SystemExit(2)
     hosts = read_hosts(base)
-    combined = base / args.out
+    journal = None
+    if not args.dry_run:
+        try:
+            journal = RunJournal('add_dhcp_pool_and_gather', resume=args.resume, out=args.out)
+        except FileNotFoundError as e:
+            print(f"Cannot resume: {e}")
+            raise SystemExit(2)
+        if args.resume:
+            print(f"Resuming run {journal.run_id}: {len(journal.succeeded())} hosts already done")
+        else:
+            print(f"Run id {journal.run_id} (finish an interrupted run with --resume {journal.run_id})")
+    combined = base / (journal.info.get('out', args.out) if journal else args.out)
     combined.write_text('')
     successes = 0
     for ip, name in hosts:
-        ok, out = run_on_host(ip, name, creds['device_user'], creds['device_pass'], dry_run=args.dry_run, debug=args.debug)
         header = f"--- {name} ({ip}) ---\n"
+        if journal and journal.done(name):
+            # Configured before the interruption; its output was kept in the journal
+            print(f"{name}: already configured in run {journal.run_id}, skipping")
+            combined.write_text(combined.read_text() + header + journal.entries[name]['detail'] + "\n\n")
+            successes += 1
+            continue
+        ok, out = run_on_host(ip, name, creds['device_user'], creds['device_pass'], dry_run=args.dry_run, debug=args.debug)
+        if journal:
+            journal.record(name, ip, ok, out)
         if ok:
             combined.write_text(combined.read_text() + header + out + "\n\n")
             successes += 1
         else:
             combined.write_text(combined.read_text() + header + "ERROR: " + out + "\n\n")
+    if journal:
+        journal.close(complete=True)
 
     print(f"Completed {successes}/{len(hosts)}")
 
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+journal.py
+
+Run journal shared by the fleet scripts, so a run that dies partway (a killed
+cron, a VPN drop) can be finished later without starting again from host one.
+Every run gets a run id (its start time, YYYYmmdd_HHMMSS) and appends one JSON
+line per host to journals/<script>_<run_id>.jsonl the moment that host is done:
+
+    {"run_id": "20251104_093148", "script": "banner", "started": "...", ...}   # header
+    {"host": "SWTC19AC01", "ip": "10.9.1.10", "ok": true, "detail": "", "time": "..."}
+    {"complete": true, "time": "..."}                                          # clean finish
+
+Each line is flushed to disk before the next host starts, so at most the host
+in flight is lost. Resuming reopens the same journal: hosts recorded ok are
+skipped, failed ones are tried again, and the header carries whatever the
+script needs to write into the same output (e.g. its .partial.csv).
+
+    journal = RunJournal('banner', resume=args.resume)
+    for ip, name in hosts:
+        if journal.done(name):
+            continue
+        ok = push(...)
+        journal.record(name, ip, ok)
+    journal.close(complete=True)
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+JOURNAL_DIR = Path(__file__).parent / 'journals'
+RUN_ID_FORMAT = '%Y%m%d_%H%M%S'
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class RunJournal:
+    """Append-only per-host journal of one run; resume=<run id> reopens an earlier run's journal.
+
+    Extra keyword arguments are stored in the header of a new run and
+    available as `info` (for a resumed run: those of the original run).
+    Raises FileNotFoundError when the run to resume has no journal.
+    """
+
+    def __init__(self, script, resume=None, directory=JOURNAL_DIR, **info):
+        directory = Path(directory)
+        self.script = script
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.complete = False
+        if resume:
+            self.run_id = resume
+            self.path = directory / f"{script}_{resume}.jsonl"
+            if not self.path.is_file():
+                raise FileNotFoundError(f"no journal for run {resume} ({self.path})")
+            header = None
+            for line in self.path.read_text().splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # the line being written when the run died
+                if header is None:
+                    header = record
+                elif 'host' in record:
+                    self.entries[record['host']] = record
+                elif record.get('complete'):
+                    self.complete = True
+            self.info = {k: v for k, v in (header or {}).items() if k not in ('run_id', 'script', 'started')}
+            self.started = (header or {}).get('started')
+        else:
+            now = datetime.now()
+            self.run_id = now.strftime(RUN_ID_FORMAT)
+            self.path = directory / f"{script}_{self.run_id}.jsonl"
+            self.info = info
+            self.started = now.strftime(TIME_FORMAT)
+            directory.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, 'a')
+        if not resume:
+            self._write({'run_id': self.run_id, 'script': script, 'started': self.started, **info})
+
+    def _write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def done(self, name):
+        """True when `name` was completed successfully earlier in this run."""
+        return self.entries.get(name, {}).get('ok', False)
+
+    def succeeded(self):
+        """Entries of the hosts completed successfully so far, in the order they finished."""
+        return [entry for entry in self.entries.values() if entry['ok']]
+
+    def record(self, name, ip, ok, detail=''):
+        """Journal the result of `name`; safe to call from worker threads."""
+        entry = {'host': name, 'ip': ip, 'ok': bool(ok), 'detail': detail,
+                 'time': datetime.now().strftime(TIME_FORMAT)}
+        with self.lock:
+            self.entries[name] = entry
+            self._write(entry)
+
+    def close(self, complete=False):
+        """Close the journal; `complete` marks the run as finished (resuming it then has nothing to do)."""
+        with self.lock:
+            if complete and not self.complete:
+                self._write({'complete': True, 'time': datetime.now().strftime(TIME_FORMAT)})
+                self.complete = True
+            self.file.close()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+preflight.py
+
+Pre-flight reachability sweep shared by the collectors. Every host gets a
+plain TCP connect to port 22 with a short timeout, all in parallel, before
+any SSH session starts. Hosts that do not answer are reported down at once,
+instead of each one holding a session worker for the full login timeout.
+
+    results = sweep([ip for ip, _ in hosts])        # {ip: {'reachable', 'rtt_ms', 'error'}}
+    up = [(ip, name) for ip, name in hosts if results[ip]['reachable']]
+    write_results(path, [(name, ip) for ip, name in hosts], results)
+"""
+
+import csv
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SSH_PORT = 22
+PROBE_TIMEOUT = 2
+
+
+def probe(host_ip, port=SSH_PORT, timeout=PROBE_TIMEOUT):
+    """TCP connect to host_ip:port; returns {'reachable', 'rtt_ms', 'error'}."""
+    start = time.monotonic()
+    try:
+        with socket.create_connection((host_ip, port), timeout=timeout):
+            pass
+    except OSError as e:
+        error = 'timed out' if isinstance(e, socket.timeout) else (e.strerror or str(e) or e.__class__.__name__)
+        return {'reachable': False, 'rtt_ms': None, 'error': error}
+    return {'reachable': True, 'rtt_ms': round((time.monotonic() - start) * 1000, 1), 'error': ''}
+
+
+def sweep(host_ips, port=SSH_PORT, timeout=PROBE_TIMEOUT, workers=64):
+    """Probe every address in parallel; returns {ip: probe result}.
+
+    The whole sweep takes about `timeout` seconds per `workers` dead hosts.
+    """
+    host_ips = list(dict.fromkeys(host_ips))
+    if not host_ips:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(host_ips)))) as executor:
+        return dict(zip(host_ips, executor.map(lambda ip: probe(ip, port, timeout), host_ips)))
+
+
+def write_results(path, hosts, results):
+    """Write one row per (name, ip) in `hosts`: host, ip, reachable, rtt_ms, error."""
+    with open(path, mode='w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['host', 'ip', 'reachable', 'rtt_ms', 'error'])
+        for name, ip in hosts:
+            result = results.get(ip, {})
+            writer.writerow([name, ip, 'yes' if result.get('reachable') else 'no',
+                             '' if result.get('rtt_ms') is None else result['rtt_ms'], result.get('error', '')])
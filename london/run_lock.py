@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+run_lock.py
+
+Per-site run lock for the collectors, so an overrunning cron run and the next
+one never hit the same switches at once. The lock is an flock() on a file next
+to the scripts (one folder per site, so one lock per site); the kernel drops
+it when the holder exits, even on a crash, so there are no stale locks.
+
+The holder writes who it is into the lock file ({'pid', 'run_id', 'started'})
+and, once done, its result into <lock>.last.json, stamped with the same pid
+and start time, so a second invocation can see what is in flight and pick up
+its outcome instead of collecting again:
+
+    lock = RunLock(Path(__file__).parent / 'sh_int_and_sh_mac.lock')
+    if not lock.acquire({'run_id': run_id}):
+        holder = lock.holder()              # the run in flight
+        if lock.wait(timeout=3600):         # it finished; we now hold the lock
+            lock.finished_by(holder)        # its {'result', 'finished', ...}, or {} if it saved none
+    ...
+    lock.finish({'run_id': run_id, 'result': csv_filename})
+"""
+
+import fcntl
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+POLL_INTERVAL = 5
+HOLDER_READS = 3
+
+
+class RunLock:
+    """Exclusive, non-reentrant lock on `path`; released by release(), finish() or process exit."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.result_path = self.path.with_suffix('.last.json')
+        self.fd = None
+
+    def acquire(self, info=None):
+        """Take the lock without blocking; returns False when another run holds it."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        record = {'pid': os.getpid(), 'started': datetime.now().strftime(TIME_FORMAT), **(info or {})}
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, json.dumps(record).encode(), 0)
+        return True
+
+    def update(self, **info):
+        """Add to what the holder advertises in the lock file (e.g. the run id once known)."""
+        record = {**self.holder(), **info}
+        os.ftruncate(self.fd, 0)
+        os.pwrite(self.fd, json.dumps(record).encode(), 0)
+
+    def wait(self, timeout=None, info=None):
+        """Poll until the lock is free and take it; False if `timeout` seconds pass first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.acquire(info):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL if deadline is None else max(0, min(POLL_INTERVAL, deadline - time.monotonic())))
+        return True
+
+    def holder(self):
+        """What the current (or last) holder wrote into the lock file; {} if nothing readable.
+
+        An empty or half-written file is read again a few times, as the holder
+        may be rewriting it at that moment (acquire(), update()).
+        """
+        for _ in range(HOLDER_READS):
+            try:
+                record = json.loads(self.path.read_text() or '{}')
+                if record:
+                    return record
+            except (OSError, ValueError):
+                pass
+            time.sleep(0.1)
+        return {}
+
+    def last_result(self):
+        """What the last run to finish() recorded; {} if none."""
+        try:
+            return json.loads(self.result_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def finished_by(self, holder):
+        """last_result() if it was recorded by `holder` (a holder() record), else {}.
+
+        Matched on pid and start time, which the holder writes when it takes the
+        lock, so it also works for a holder that had no run id yet.
+        """
+        result = self.last_result()
+        if not holder or (result.get('pid'), result.get('started')) != (holder.get('pid'), holder.get('started')):
+            return {}
+        return result
+
+    def finish(self, result):
+        """Record `result` for runs waiting on this one, then release the lock."""
+        holder = self.holder()
+        record = {'pid': holder.get('pid'), 'started': holder.get('started'), **result,
+                  'finished': datetime.now().strftime(TIME_FORMAT)}
+        tmp = self.result_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(record, indent=2))
+        os.replace(tmp, self.result_path)
+        self.release()
+
+    def release(self):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+scheduler.py
+
+Long-running scheduler for the MAC collection, in place of the cron entries
+that start run_sh_int_and_sh_mac.sh, compare_mac_baseline.py and
+merge_unique_diff_macs.py separately. It owns the slot definitions:
+
+    SITES = {'LON': BASE at 20:00, DAYTIME at 05:00 and 09:00,
+             'WTC': BASE at 00:00, DAYTIME at 10:00 and 14:00}
+
+A slot's collection starts a random 0..--jitter seconds after the hour, so
+both sites do not hit shared links and AAA servers in the same second. It
+gets a --deadline a few minutes before the site's next slot. Right after a
+DAYTIME collection the new CSV is compared against the BASE snapshots and
+the diffs are merged, so the whole chain is done minutes after the
+collection instead of waiting for the next cron job.
+
+With --agent an ssh_agent.py is kept running next to the scheduler, with
+an idle timeout longer than the longest gap between slots. Its sessions
+stay logged in from one slot to the next and each collection skips the
+logins. Per-host parsed state (platform_cache.json, host_health.json)
+already carries over between runs on disk. Every collection is a separate
+process, holding the site's run lock (run_lock.py), so a manual run or a
+left-over cron entry cannot overlap it.
+
+Run one scheduler per site, from that site's folder:
+
+    python3 scheduler.py --site WTC --jitter 120 --agent -- --workers 8 --hosts Hosts-WTC.txt
+    python3 scheduler.py --site LON --list          # print the next slots and exit
+"""
+
+import argparse
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from run_lock import RunLock, TIME_FORMAT
+from ssh_agent import DEFAULT_SOCKET, agent_available
+
+HERE = Path(__file__).parent
+SITES = {
+    'LON': {'BASE': (20,), 'DAYTIME': (5, 9)},
+    'WTC': {'BASE': (0,), 'DAYTIME': (10, 14)},
+}
+JITTER = 120
+DEADLINE_MARGIN = 5   # minutes before the next slot that a collection must stop
+LOCK_PATH = HERE / 'sh_int_and_sh_mac.lock'   # as in sh_int_and_sh_mac.py
+
+
+def slot_for(hour):
+    """'BASE', 'DAYTIME' or '' for a collection started at `hour`, whichever site's slot it is."""
+    for slot in ('BASE', 'DAYTIME'):
+        if any(hour in hours[slot] for hours in SITES.values()):
+            return slot
+    return ''
+
+
+def next_slot(site, now):
+    """(start, slot) of the first slot of `site` after `now`."""
+    starts = [(now.replace(hour=hour, minute=0, second=0, microsecond=0) + timedelta(days=day), slot)
+              for day in (0, 1) for slot, hours in SITES[site].items() for hour in hours]
+    return min((start, slot) for start, slot in starts if start > now)
+
+
+def longest_gap(site):
+    """Longest time between two consecutive slots of `site`."""
+    hours = sorted(hour for hours in SITES[site].values() for hour in hours)
+    return timedelta(hours=max((b - a) % 24 or 24 for a, b in zip(hours, hours[1:] + hours[:1])))
+
+
+def sleep_until(when):
+    # Short naps, so a clock change or a suspended VM does not oversleep a slot
+    while True:
+        remaining = (when - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, 60))
+
+
+def ensure_agent(site, agent):
+    """Start ssh_agent.py unless one answers on its socket; returns the agent process (or the running one)."""
+    if agent_available(DEFAULT_SOCKET):
+        return agent
+    if agent is not None and agent.poll() is None:
+        agent.terminate()
+    idle_close = int((longest_gap(site) + timedelta(hours=1)).total_seconds())
+    agent = subprocess.Popen([sys.executable, str(HERE / 'ssh_agent.py'), '--idle-close', str(idle_close)], cwd=HERE)
+    for _ in range(30):
+        if agent_available(DEFAULT_SOCKET):
+            break
+        time.sleep(1)
+    else:
+        print("Warning: ssh_agent.py did not come up, collecting without it")
+    return agent
+
+
+def run(command, log):
+    """Run one step of the chain in the site folder, output appended to `log`; returns the exit code."""
+    log.write(f"\n==== {' '.join(command[1:])} at {datetime.now():%Y-%m-%d %H:%M:%S} ====\n")
+    log.flush()
+    return subprocess.call(command, cwd=HERE, stdout=log, stderr=subprocess.STDOUT)
+
+
+def run_slot(site, slot, collector_args, use_agent):
+    """Collect for `slot` and, after a DAYTIME collection, compare and merge; output goes to logs/."""
+    started = datetime.now()
+    stop_at = next_slot(site, started)[0] - timedelta(minutes=DEADLINE_MARGIN)
+    log_dir = HERE / 'logs'
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_path = log_dir / f"sh_int_and_sh_mac_{datetime.now(timezone.utc):%Y%m%d_%H%M%S}.log"
+    print(f"[{started:%Y-%m-%d %H:%M:%S}] {site} {slot or 'unscheduled'} collection, "
+          f"deadline {stop_at:%H:%M}, log {log_path.name}")
+    command = [sys.executable, str(HERE / 'sh_int_and_sh_mac.py'), '--deadline', f"{stop_at:%H:%M}"]
+    if use_agent:
+        command.append('--agent')
+    with open(log_path, 'a') as log:
+        rc = run(command + list(collector_args), log)
+        result = RunLock(LOCK_PATH).last_result()
+        if rc != 0 or result.get('finished', '') < started.strftime(TIME_FORMAT):
+            print(f"  no new snapshot (exit code {rc}), see {log_path.name}")
+            return
+        csv_path = result['result']
+        print(f"  {result.get('collected', '?')}/{result.get('hosts', '?')} hosts -> {Path(csv_path).name}")
+        if slot != 'DAYTIME':
+            return
+        if not csv_path.endswith('.DAYTIME.csv'):
+            print(f"  {Path(csv_path).name} is not a DAYTIME snapshot, not comparing it")
+            return
+        if run([sys.executable, str(HERE / 'compare_mac_baseline.py'), '--compare', csv_path], log) != 0:
+            print(f"  compare_mac_baseline.py failed, see {log_path.name}")
+            return
+        if run([sys.executable, str(HERE / 'merge_unique_diff_macs.py')], log) != 0:
+            print(f"  merge_unique_diff_macs.py failed, see {log_path.name}")
+            return
+        print("  compared against the BASE snapshots and merged the diffs")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the MAC collection at the BASE/DAYTIME slots of a site, with compare and merge after '
+                    'each DAYTIME slot. Arguments after -- go to sh_int_and_sh_mac.py.')
+    parser.add_argument('--site', required=True, choices=sorted(SITES), help='Site this folder collects')
+    parser.add_argument('--jitter', type=float, default=JITTER,
+                        help=f'Start each collection up to this many seconds after the slot (default: {JITTER})')
+    parser.add_argument('--agent', action='store_true',
+                        help='Keep an ssh_agent.py running so sessions stay logged in between slots')
+    parser.add_argument('--list', action='store_true', help='Print the next slots and exit')
+    parser.add_argument('collector_args', nargs=argparse.REMAINDER,
+                        help='Extra arguments for sh_int_and_sh_mac.py, after --')
+    args = parser.parse_args()
+    collector_args = args.collector_args[1:] if args.collector_args[:1] == ['--'] else args.collector_args
+    # Stay inside the hour, which is what names the snapshot's slot
+    jitter = min(max(0.0, args.jitter), 15 * 60)
+
+    if args.list:
+        when = datetime.now()
+        for _ in range(2 * sum(len(hours) for hours in SITES[args.site].values())):
+            when, slot = next_slot(args.site, when)
+            print(f"{when:%a %Y-%m-%d %H:%M}  {args.site} {slot}")
+        return
+
+    agent = None
+    print(f"Scheduler for {args.site}: BASE at {SITES[args.site]['BASE']}, DAYTIME at {SITES[args.site]['DAYTIME']}"
+          f" (hours), up to {jitter:.0f}s jitter")
+    try:
+        while True:
+            when, slot = next_slot(args.site, datetime.now())
+            start = when + timedelta(seconds=random.uniform(0, jitter))
+            print(f"Next: {slot} at {start:%Y-%m-%d %H:%M:%S}")
+            sleep_until(start)
+            try:
+                if args.agent:
+                    agent = ensure_agent(args.site, agent)
+                run_slot(args.site, slot, collector_args, args.agent and agent_available(DEFAULT_SOCKET))
+            except Exception as e:
+                print(f"  {slot} slot failed: {e}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if agent is not None and agent.poll() is None:
+            agent.terminate()
+
+
+if __name__ == '__main__':
+    main()
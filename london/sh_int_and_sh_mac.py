@@ -1,370 +1,677 @@
 #!/usr/bin/python3
-import re
 import csv
-import paramiko
+import io
+import os
 import sys
+import time
 from pathlib import Path
 from cryptography.fernet import Fernet
-from datetime import datetime
-import io
+from datetime import datetime, timedelta
 import argparse
-try:
-    import textfsm
-    HAVE_TEXTFSM = True
-except Exception:
-    HAVE_TEXTFSM = False
-
-# ==== Load and decrypt credentials from credentials.txt.enc ====
-enc_path = Path(__file__).parent / "credentials.txt.enc"
-key_path = Path(__file__).parent / "secret.key"
-if not enc_path.is_file():
-    print(f"Error: credentials.txt.enc not found in {enc_path.parent}")
-    sys.exit(1)
-if not key_path.is_file():
-    print(f"Error: secret.key not found in {key_path.parent}")
-    sys.exit(1)
-
-with open(key_path, "rb") as kf:
-    key = kf.read()
-fernet = Fernet(key)
-with open(enc_path, "rb") as ef:
-    decrypted = fernet.decrypt(ef.read()).decode("utf-8")
-
-creds = {}
-for line in decrypted.splitlines():
-    line = line.strip()
-    if not line or line.startswith("#"):
-        continue
-    if "=" in line:
-        key, value = line.split("=", 1)
-        creds[key.strip()] = value.strip()
-
-required_keys = [
-    "device_user", "device_pass"
-]
-for key in required_keys:
-    if key not in creds:
-        print(f"Error: Missing '{key}' in credentials.txt")
-        sys.exit(1)
+from ssh_session import SSHSession, format_stats
+from ssh_agent import AgentSession, agent_available, DEFAULT_SOCKET
+from async_collector import run_fleet
+from platform_cache import PlatformCache
+from junos_xml import JUNOS_INT_COMMAND, JUNOS_MAC_COMMAND, JUNOS_INT_RPC, JUNOS_MAC_RPC, netconf_run
+from parsers import parse, stream_parser, InterfaceIndex, ParserPool, INT_COMMAND, MAC_COMMAND
+from pipeline import run_pipeline, in_order, longest_first, NOT_STARTED, CANCELLED
+from preflight import sweep, write_results, PROBE_TIMEOUT
+from host_health import HostHealth
+from journal import RunJournal, RUN_ID_FORMAT
+from run_lock import RunLock, TIME_FORMAT
+from scheduler import slot_for
+
+CSV_FIELDS = ["host", "interface", "admin_status", "oper_status", "description", "mac address", "vlan"]
+DESC_FIELDS = ["host", "interface", "admin_status", "oper_status", "description"]
+DEADLINE_GRACE = 60
+LOCK_PATH = Path(__file__).parent / 'sh_int_and_sh_mac.lock'
+LOCK_WAIT = 3600
+
+
+def deadline_seconds(value, now):
+    """Seconds from `now` until --deadline: minutes after the start ('50') or the next HH:MM ('04:55')."""
+    if ':' in value:
+        hour, minute = (int(part) for part in value.split(':'))
+        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+    return float(value) * 60
+
+
+def csv_text(rows, fieldnames):
+    """`rows` (dicts) as CSV lines without a header, ready to be written to the output file."""
+    out = io.StringIO()
+    csv.DictWriter(out, fieldnames=fieldnames).writerows(rows)
+    return out.getvalue()
+
+
+def drop_unjournaled_rows(path, journal):
+    """Rewrite the CSV at `path` keeping only rows of hosts `journal` has recorded as done.
+
+    A host's rows are flushed before it is journaled, so a run killed in between
+    leaves rows of a host that the resumed run collects again. Returns the number
+    of rows dropped; a missing file is left alone.
+    """
+    if not path.is_file():
+        return 0
+    tmp = path.with_suffix('.tmp')
+    dropped = 0
+    with open(path, newline="") as src, open(tmp, mode="w", newline="") as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        header = next(reader, None)
+        if header is not None:
+            writer.writerow(header)
+        for row in reader:
+            if row and journal.done(row[0]):
+                writer.writerow(row)
+            else:
+                dropped += 1
+    os.replace(tmp, path)
+    return dropped
+
+
+def join_mac_rows(host_name, entries, interfaces):
+    """Join each parsed MAC entry ({vlan, mac, port}) to its interface description.
+
+    Ports are matched by canonical name (parsers.InterfaceIndex), so Gi1/0/1 in the
+    MAC table finds GigabitEthernet1/0/1 in the description table.
+    """
+    index = InterfaceIndex(interfaces)
+    rows = []
+    for mac_data in entries:
+        port = mac_data["port"]
+        if port.upper() == "CPU":
+            continue
+        values = index.get(port, {})
+        entry = {
+            "host": host_name,
+            "interface": port,
+            "admin_status": values.get("admin_status", ""),
+            "oper_status": values.get("oper_status", ""),
+            "description": values.get("description", ""),
+            "mac address": mac_data["mac"],
+            "vlan": mac_data["vlan"]
+        }
+        rows.append(entry)
+    return rows
 
-device_user = creds["device_user"]
-device_pass = creds["device_pass"]
 
-# ==== hosts.txt file in same folder as script ====
-hosts_path = Path(__file__).parent / "hosts.txt"
-if not hosts_path.is_file():
-    print(f"Error: hosts.txt not found in {hosts_path.parent}")
-    sys.exit(1)
+def parse_host(host_name, platform, int_output, mac_output, debug=False, int_stats=None, mac_stats=None,
+               int_command=INT_COMMAND, mac_command=MAC_COMMAND, int_rows=None, mac_rows=None, parse=parse):
+    """Turn one host's raw outputs into (rows, interfaces).
 
-# Read hosts file which may contain lines like: "hostname ip_address"
-# We'll store a list of tuples (ip, hostname). If only an IP is provided, hostname==ip.
-hosts = []
-with open(hosts_path) as f:
-    for line in f:
+    Shared by every backend (threads, agent, asyncio) so parsing does not
+    depend on how the outputs were collected. The parser comes from the
+    registry in parsers.py, keyed by platform and the command actually sent
+    (text, '| display xml' or a NETCONF RPC). `int_rows`/`mac_rows` are rows
+    already parsed while streaming; the matching output is then not parsed again.
+    `parse` can be swapped for a ParserPool's parse() to parse in worker processes.
+    """
+    is_juniper = platform == 'juniper'
+    is_cisco = platform == 'cisco'
+    int_stats = int_stats or {}
+    mac_stats = mac_stats or {}
+    if int_rows is None:
+        int_rows = parse(platform, int_command, int_output)
+    if mac_rows is None:
+        mac_rows = parse(platform, mac_command, mac_output)
+    interfaces = {}
+    for row in int_rows:
+        interfaces[row["interface"]] = {"admin_status": row["admin_status"],
+                                        "oper_status": row["oper_status"],
+                                        "description": row["description"]}
+    if debug:
+        safe = host_name.replace('/', '_')
+        try:
+            with open(f"/tmp/{safe}_int_raw.txt", 'w') as f:
+                f.write(int_output)
+            with open(f"/tmp/{safe}_mac_raw.txt", 'w') as f:
+                f.write(mac_output)
+            with open(f"/tmp/{safe}_parse_summary.txt", 'w') as f:
+                f.write(f"Detected: {'cisco' if is_cisco else ('juniper' if is_juniper else 'unknown')}\n")
+                f.write(f"Parsed interfaces: {len(interfaces)}\n")
+                f.write(f"{format_stats(int_stats)}\n")
+                f.write(f"{format_stats(mac_stats)}\n")
+                for i, (k, v) in enumerate(interfaces.items()):
+                    if i >= 20:
+                        break
+                    f.write(f"{k} -> {v}\n")
+        except Exception as e:
+            print(f"Failed to write debug files for {host_name}: {e}")
+    rows = join_mac_rows(host_name, mac_rows, interfaces)
+    return rows, interfaces
+
+
+def fetch_host(host_ip, host_name, device_user, device_pass, debug=False, idle_timeout=10,
+               extra_commands=(), agent_socket=None, batch=False, junos='cli', cache=None, stream=True,
+               connect_timeout=10):
+    """Run the show commands on one switch; parse_fetched() turns the result into rows.
+
+    Returns {'platform', 'results', 'parsed', 'connect_time'}: results is
+    [(command, output, stats), ...] with the two table commands first, parsed
+    maps a table command to the rows parsed while it streamed in (its output
+    is then '') and connect_time is how long the SSH login took (None via the
+    agent or NETCONF). Connection and session errors are raised to the caller.
+
+    Everything runs over a single session, including `extra_commands` (e.g.
+    the DHCP section), so each device sees one login per run.
+    With `agent_socket` the commands go through the running ssh_agent.py, which
+    already holds an authenticated session to the host.
+    Command output is read until the prompt returns; a read only gives up after
+    `idle_timeout` seconds without new bytes, so large MAC tables are not cut off.
+    With `batch` all commands go to IOS devices in one round trip (SSHSession.run_batch).
+    `junos` selects how Juniper devices are read: 'cli' (text), 'xml'
+    ('| display xml' on the same session) or 'netconf' (RPCs on port 830;
+    with the platform cached as Juniper no SSH CLI session is opened at all).
+    With a PlatformCache the session starts from the host's cached profile
+    instead of sniffing the banner, and a freshly detected profile is stored.
+    On a direct session the two tables are parsed line by line as they arrive
+    (parsers.stream_parser); with `stream` False or --debug they are returned
+    as raw text.
+    """
+    profile = cache.get(host_name, host_ip) if cache is not None and not agent_socket else None
+    if junos == 'netconf' and profile and profile['platform'] == 'juniper':
+        # Known Juniper: everything, extra commands included, goes over the one NETCONF login
+        print(f"\nConnecting to {host_name} ({host_ip}) over NETCONF...")
+        results = netconf_run(host_ip, device_user, device_pass, [JUNOS_INT_RPC, JUNOS_MAC_RPC],
+                              commands=extra_commands)
+        for command, output, stats in results:
+            print(f"{host_name}: {format_stats(stats)}")
+        return {'platform': 'juniper', 'results': results, 'parsed': {}, 'connect_time': None}
+    if agent_socket:
+        print(f"\nAttaching to {host_name} ({host_ip}) via agent...")
+        session = AgentSession(host_ip, agent_socket, idle_timeout=idle_timeout)
+    else:
+        print(f"\nConnecting to {host_name} ({host_ip})...")
+        session = SSHSession(host_ip, device_user, device_pass, connect_timeout=connect_timeout,
+                             idle_timeout=idle_timeout, profile=profile)
+    # Connects, learns the prompt, detects the platform and disables paging / enters cli
+    with session:
+        if cache is not None and not agent_socket:
+            cache.update(host_name, host_ip, session.profile())
+        if session.platform == 'juniper' and junos == 'xml':
+            table_commands = [JUNOS_INT_COMMAND, JUNOS_MAC_COMMAND]
+        elif session.platform == 'juniper' and junos == 'netconf':
+            table_commands = []
+        else:
+            table_commands = [INT_COMMAND, MAC_COMMAND]
+        parsed = {}
+        if batch:
+            # Every command goes out in one write; marker lines split the replies apart again
+            results = session.run_batch(table_commands + list(extra_commands))
+        elif stream and not agent_socket and not debug:
+            results = []
+            for command in table_commands:
+                stats = {}
+                parser = stream_parser(session.platform, command)
+                session.run(command, stats=stats, sink=parser)
+                parsed[command] = parser.close()
+                results.append((command, '', stats))
+            results += session.run_many(extra_commands)
+        else:
+            results = session.run_many(table_commands + list(extra_commands))
+    if session.platform == 'juniper' and junos == 'netconf':
+        results = netconf_run(host_ip, device_user, device_pass, [JUNOS_INT_RPC, JUNOS_MAC_RPC]) + results
+    for command, output, stats in results:
+        print(f"{host_name}: {format_stats(stats)}")
+    return {'platform': session.platform, 'results': results, 'parsed': parsed,
+            'connect_time': getattr(session, 'connect_time', None)}
+
+
+def parse_fetched(host_name, fetched, debug=False, parse=parse):
+    """Turn fetch_host()'s result into (rows, interfaces, extra_outputs).
+
+    rows are the joined MAC rows, interfaces is the parsed description table
+    and extra_outputs maps each extra command to its raw output.
+    """
+    results = fetched['results']
+    parsed = fetched.get('parsed', {})
+    (int_command, int_output, int_stats), (mac_command, mac_output, mac_stats) = results[:2]
+    if not int_stats.get('prompt_found'):
+        print(f"Warning: Prompt not detected for {host_name} (interfaces). Output may be incomplete.")
+    if not mac_stats.get('prompt_found'):
+        print(f"Warning: Prompt not detected for {host_name} (mac). Output may be incomplete.")
+    # Any further commands reused the same login
+    extra_outputs = {command: output for command, output, _ in results[2:]}
+    rows, interfaces = parse_host(host_name, fetched['platform'], int_output, mac_output, debug=debug,
+                                  int_stats=int_stats, mac_stats=mac_stats,
+                                  int_command=int_command, mac_command=mac_command,
+                                  int_rows=parsed.get(int_command), mac_rows=parsed.get(mac_command),
+                                  parse=parse)
+    return rows, interfaces, extra_outputs
+
+
+def fetch_hosts_asyncio(hosts, device_user, device_pass, concurrency, host_timeout, idle_timeout=10,
+                        extra_commands=(), deadline=None, grace=0):
+    """asyncio backend: collect every host through async_collector.
+
+    Returns one (ok, fetched_or_error) per host in hosts order, where fetched
+    has the same shape as fetch_host()'s result.
+    """
+    commands = [INT_COMMAND, MAC_COMMAND] + list(extra_commands)
+    fleet = run_fleet([ip for ip, _ in hosts], device_user, device_pass, commands,
+                      concurrency=concurrency, host_timeout=host_timeout, idle_timeout=idle_timeout,
+                      deadline=deadline, grace=grace)
+    results = []
+    for (host_ip, host_name), (ok, result) in zip(hosts, fleet):
+        if ok:
+            for command, output, stats in result['results']:
+                print(f"{host_name}: {format_stats(stats)}")
+            result['parsed'] = {}
+        results.append((ok, result))
+    return results
+
+
+def main():
+    # ==== Load and decrypt credentials from credentials.txt.enc ====
+    enc_path = Path(__file__).parent / "credentials.txt.enc"
+    key_path = Path(__file__).parent / "secret.key"
+    if not enc_path.is_file():
+        print(f"Error: credentials.txt.enc not found in {enc_path.parent}")
+        sys.exit(1)
+    if not key_path.is_file():
+        print(f"Error: secret.key not found in {key_path.parent}")
+        sys.exit(1)
+    with open(key_path, "rb") as kf:
+        key = kf.read()
+    fernet = Fernet(key)
+    with open(enc_path, "rb") as ef:
+        decrypted = fernet.decrypt(ef.read()).decode("utf-8")
+    creds = {}
+    for line in decrypted.splitlines():
         line = line.strip()
-        if not line:
+        if not line or line.startswith("#"):
             continue
-        parts = line.split()
-        if len(parts) >= 2:
-            hostname = parts[0]
-            ip = parts[1]
+        if "=" in line:
+            k, value = line.split("=", 1)
+            creds[k.strip()] = value.strip()
+    required_keys = ["device_user", "device_pass"]
+    for k in required_keys:
+        if k not in creds:
+            print(f"Error: Missing '{k}' in credentials.txt")
+            sys.exit(1)
+    device_user = creds["device_user"]
+    device_pass = creds["device_pass"]
+
+    # CLI args
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--debug', action='store_true', help='Write raw outputs and parse summaries to /tmp')
+    parser.add_argument('--hosts', default='hosts.txt',
+                        help='Hosts file next to the script, e.g. Hosts-WTC.txt (default: hosts.txt)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of hosts to collect in parallel (default: 1, sequential)')
+    parser.add_argument('--idle-timeout', type=float, default=None,
+                        help='Seconds without new output before a command is considered stalled, for every host '
+                             '(default: learned per host in host_health.json, 10 without history)')
+    parser.add_argument('--connect-timeout', type=float, default=None,
+                        help='SSH connect timeout in seconds, for every host '
+                             '(default: learned per host in host_health.json, 10 without history)')
+    parser.add_argument('--with-dhcp', action='store_true',
+                        help="Also run 'sh run | sec dhcp' on the same session and save it under outputs/")
+    parser.add_argument('--with-descriptions', action='store_true',
+                        help='Also write the interfaces_description_<ts>.csv produced by sh_int_desc.py')
+    parser.add_argument('--agent', nargs='?', const=str(DEFAULT_SOCKET), default=None, metavar='SOCKET',
+                        help='Run commands through a running ssh_agent.py (default socket: ./ssh_agent.sock)')
+    parser.add_argument('--backend', choices=['threads', 'asyncio'], default='threads',
+                        help='threads: paramiko worker pool; asyncio: async_collector (asyncssh), '
+                             '--workers is then the concurrency limit')
+    parser.add_argument('--host-timeout', type=float, default=300,
+                        help='asyncio backend: give up on a host after this many seconds (default: 300)')
+    parser.add_argument('--batch', action='store_true',
+                        help='Cisco IOS: send all show commands in one round trip, split by marker lines (threads backend)')
+    parser.add_argument('--junos', choices=['cli', 'xml', 'netconf'], default='cli',
+                        help="Juniper devices: scrape CLI text, parse '| display xml', or use NETCONF RPCs "
+                             "(threads backend; default: cli)")
+    parser.add_argument('--refresh-platforms', action='store_true',
+                        help='Ignore platform_cache.json and detect every host again (threads backend)')
+    parser.add_argument('--no-preflight', action='store_true',
+                        help='Skip the TCP/22 reachability sweep and try SSH on every host')
+    parser.add_argument('--probe-timeout', type=float, default=PROBE_TIMEOUT,
+                        help=f'Seconds to wait for TCP/22 in the pre-flight sweep (default: {PROBE_TIMEOUT})')
+    parser.add_argument('--retry-all', action='store_true',
+                        help='Also collect hosts whose circuit is open in host_health.json')
+    parser.add_argument('--parse-processes', type=int, default=0, metavar='N',
+                        help='Parse large outputs in N worker processes instead of on the collector threads '
+                             '(default: 0, off)')
+    parser.add_argument('--resume', metavar='RUN_ID',
+                        help='Finish an interrupted run: collect only the hosts it had not done and add '
+                             'their rows to its .partial.csv')
+    parser.add_argument('--deadline', metavar='MINUTES|HH:MM',
+                        help='Stop starting hosts after this many minutes, or at this time of day; the hosts '
+                             'not collected are listed in <csv>_skipped.csv (default: no deadline)')
+    parser.add_argument('--deadline-grace', type=float, default=DEADLINE_GRACE,
+                        help=f'Seconds hosts already running get after the deadline before they are cancelled '
+                             f'(default: {DEADLINE_GRACE})')
+    parser.add_argument('--if-running', choices=['auto', 'attach', 'wait', 'skip'], default='auto',
+                        help='When another run for this site is in flight: attach (wait for it and report its '
+                             'CSV), wait (then collect), skip (leave it to the next slot), or auto: attach to a '
+                             'run started in the same hour, skip otherwise (default: auto)')
+    parser.add_argument('--lock-wait', type=float, default=LOCK_WAIT,
+                        help=f'Seconds to wait on the run in flight with attach/wait (default: {LOCK_WAIT})')
+    args, _ = parser.parse_known_args()
+    # Checked here, but only counted once this run holds the lock (below)
+    deadline = None
+    invoked = time.monotonic()
+    if args.deadline:
+        try:
+            budget = deadline_seconds(args.deadline, datetime.now())
+        except ValueError:
+            print(f"Error: --deadline takes minutes or HH:MM, not {args.deadline!r}")
+            sys.exit(1)
+
+    # ==== One run per site at a time ====
+    # A second invocation never starts a competing collection against the same switches:
+    # it attaches to the run in flight when that run is for the same slot, and otherwise
+    # leaves the collection to the next slot (or queues behind it with --if-running wait).
+    lock = RunLock(LOCK_PATH)
+    if not lock.acquire({'args': sys.argv[1:]}):
+        holder = lock.holder()
+        run_id = holder.get('run_id', '')
+        # The slot it collects for: its run id, or when it took the lock if it has none yet
+        started = (datetime.strptime(run_id, RUN_ID_FORMAT) if run_id
+                   else datetime.strptime(holder.get('started', datetime.now().strftime(TIME_FORMAT)), TIME_FORMAT))
+        same_slot = started.strftime('%Y%m%d%H') == datetime.now().strftime('%Y%m%d%H')
+        mode = args.if_running
+        if mode == 'auto':
+            mode = 'attach' if same_slot else 'skip'
+        print(f"Run {run_id or '?'} (pid {holder.get('pid', '?')}, started {started:%Y-%m-%d %H:%M}) "
+              f"is still collecting for this site")
+        if mode == 'skip':
+            print("Not starting a competing run; this collection is coalesced into the next slot")
+            return
+        if not lock.wait(args.lock_wait, {'args': sys.argv[1:]}):
+            print(f"Gave up after waiting {args.lock_wait:.0f}s for it to finish")
+            sys.exit(1)
+        if mode == 'attach':
+            lock.release()
+            result = lock.finished_by(holder)
+            if result:
+                print(f"Attached to run {result.get('run_id', run_id)}: data saved to {result['result']}")
+                return
+            print(f"Run {run_id or '?'} ended without saving a CSV, see its log")
+            sys.exit(1)
+        print("It has finished, collecting now")
+
+    # Counted from here, so the pre-flight sweep is part of the budget but waiting
+    # on the run in flight is not; an HH:MM deadline stays at that time of day
+    if args.deadline:
+        if ':' in args.deadline:
+            budget -= time.monotonic() - invoked
+        deadline = time.monotonic() + budget
+
+    # ==== Hosts file (hosts.txt or Hosts-<site>.txt) in same folder as script ====
+    hosts_path = Path(__file__).parent / args.hosts
+    if not hosts_path.is_file():
+        print(f"Error: {args.hosts} not found in {hosts_path.parent}")
+        sys.exit(1)
+    # Read hosts file which may contain lines like: "hostname ip_address" (Hosts-<site>.txt adds a /32 mask)
+    hosts = []
+    with open(hosts_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split()
+            if len(parts) >= 2:
+                hostname = parts[0]
+                ip = parts[1].split('/')[0]
+            else:
+                ip = parts[0].split('/')[0]
+                hostname = ip
+            hosts.append((ip, hostname))
+
+    DEBUG_MODE = bool(getattr(args, 'debug', False))
+    workers = max(1, args.workers)
+    dhcp_command = 'sh run | sec dhcp'
+    extra_commands = [dhcp_command] if args.with_dhcp else []
+    # Cached per-host session profiles; hosts whose IP changed in hosts.txt are re-detected
+    cache = PlatformCache()
+    if args.refresh_platforms:
+        for ip, hostname in hosts:
+            cache.entries.pop(hostname, None)
+    cache.sync_hosts(hosts)
+    agent_socket = None
+    if args.agent:
+        if agent_available(args.agent):
+            agent_socket = args.agent
         else:
-            ip = parts[0]
-            hostname = ip
-        hosts.append((ip, hostname))
-
-# ==== Regex patterns ====
-int_pattern = re.compile(
-    r"^(?P<interface>\S+)\s+"
-    r"(?P<admin_status>\S+)\s+"
-    r"(?P<oper_status>\S+)"
-    r"(?:\s+(?P<description>.*))?$"
-)
-mac_pattern = re.compile(
-    r"^(?P<vlan>\S+)\s+(?P<mac>[0-9a-fA-F:.\-]+)\s+\S+\s+(?P<port>\S+)"
-)
-# Cisco IOS-XE 'show interfaces description' commonly has: Interface  Status  Protocol  Description
-cisco_int_pattern = re.compile(
-    r"^(?P<interface>\S+)\s+"
-    r"(?P<admin_status>\S+)\s+"
-    r"(?P<oper_status>\S+)\s*"
-    r"(?P<description>.*)$"
-)
-
-# ==== Collect all parsed data ====
-all_data = []
-
-# CLI args
-parser = argparse.ArgumentParser(add_help=False)
-parser.add_argument('--debug', action='store_true', help='Write raw outputs and parse summaries to /tmp')
-args, _ = parser.parse_known_args()
-DEBUG_MODE = bool(getattr(args, 'debug', False))
-
-for host_ip, host_name in hosts:
-    print(f"\nConnecting to {host_name} ({host_ip})...")
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            print(f"Warning: no ssh_agent answering on {args.agent}, connecting directly")
+
+    # ==== Run journal ====
+    # Each host is journaled once its rows are in the .partial file, so a run that dies
+    # partway can be finished with --resume <run id>: the hosts already done are skipped
+    # and the remaining rows are appended to the same files.
     try:
-        client.connect(
-            hostname=host_ip,
-            username=device_user,
-            password=device_pass,
-            look_for_keys=False,
-            allow_agent=False,
-            timeout=10
-        )
-        shell = client.invoke_shell()
-        shell.settimeout(2)
-        import time
-        # Wait for initial prompt/banner and detect device type
-        time.sleep(1)
-        banner = ''
-        try:
-            banner = shell.recv(65535).decode('utf-8', errors='ignore')
-        except Exception:
-            banner = ''
-        is_juniper = False
-        is_cisco = False
-        low = banner.lower()
-        if 'junos' in low or 'juniper' in low:
-            is_juniper = True
-        elif 'ios' in low or 'cisco' in low or 'ios-xe' in low:
-            is_cisco = True
-
-        # For Cisco IOS-XE, disable paging
-        if is_cisco:
-            shell.send('terminal length 0\n')
-            shell.send('terminal width 511\n')
-            time.sleep(0.5)
-            try:
-                shell.recv(65535)
-            except Exception:
-                pass
-
-        # For Juniper, enter cli
-        if is_juniper:
-            shell.send('cli\n')
-            time.sleep(0.5)
-            try:
-                shell.recv(65535)
-            except Exception:
-                pass
-
-        # Get interface descriptions
-        # Cisco: 'show interfaces description' ; Juniper: 'show interfaces descriptions'
-        if is_cisco:
-            sent_cmd = 'show interfaces description'
-            shell.send(sent_cmd + '\n')
+        journal = RunJournal('sh_int_and_sh_mac', resume=args.resume, workdir=os.getcwd())
+    except FileNotFoundError as e:
+        print(f"Error: cannot resume: {e}")
+        sys.exit(1)
+    if journal.complete:
+        print(f"Run {journal.run_id} already completed, nothing to resume")
+        journal.close()
+        return
+    lock.update(run_id=journal.run_id)
+    # Output files are named after the run id, in the directory the run started in
+    workdir = Path(os.path.relpath(journal.info.get('workdir', '.')))
+    partial_filename = workdir / f"interfaces_and_mac_{journal.run_id}.partial.csv"
+    desc_partial = workdir / f"interfaces_description_{journal.run_id}.partial.csv"
+    resumed = [(entry['host'], entry['ip']) for entry in journal.succeeded()]
+    if args.resume:
+        print(f"Resuming run {journal.run_id}: {len(resumed)} hosts already collected")
+        if not partial_filename.is_file():
+            print(f"Error: {partial_filename} is missing, cannot resume run {journal.run_id}")
+            sys.exit(1)
+        dropped = drop_unjournaled_rows(partial_filename, journal)
+        drop_unjournaled_rows(desc_partial, journal)
+        if dropped:
+            print(f"Dropped {dropped} rows of hosts the interrupted run did not finish; they are collected again")
+    else:
+        print(f"Run id {journal.run_id} (finish an interrupted run with --resume {journal.run_id})")
+    hosts_todo = [(ip, hostname) for ip, hostname in hosts if not journal.done(hostname)]
+
+    # ==== Collect, parse and write in stages ====
+    # Collector threads hand raw outputs to a parser thread, and this thread writes each
+    # host's rows as soon as every host before it in hosts.txt has been written or has
+    # failed, so the CSV fills in during the run and keeps hosts.txt order whatever
+    # order the hosts finish in. The rows go to a .partial file that is renamed once the
+    # run is complete; descriptions and DHCP sections are written along with the rows.
+    failed = []
+    skipped = []
+    collected = 0
+    dhcp_saved = 0
+    cut_off = 0
+    # Per-host failure history; hosts with an open circuit only get the TCP/22 probe
+    health = HostHealth()
+    # Pre-flight: probe TCP/22 on every host at once (only the open-circuit ones with
+    # --no-preflight); hosts that do not answer are failed right away and never take a
+    # collector slot
+    if not args.no_preflight:
+        probes = sweep([ip for ip, _ in hosts_todo], timeout=args.probe_timeout)
+        print(f"Pre-flight: {sum(p['reachable'] for p in probes.values())}/{len(probes)} hosts answer on tcp/22")
+    else:
+        probes = sweep([ip for ip, hostname in hosts_todo if health.is_open(hostname)], timeout=args.probe_timeout)
+    targets = []
+    for ip, hostname in hosts_todo:
+        probe = probes.get(ip, {'reachable': True})
+        if not probe['reachable']:
+            failed.append((hostname, ip, f"tcp/22 unreachable ({probe['error']})"))
+            health.record_failure(hostname, ip, failed[-1][2], unreachable=True)
+            journal.record(hostname, ip, False, failed[-1][2])
+        elif args.retry_all or health.allow(hostname):
+            targets.append((ip, hostname))
         else:
-            sent_cmd = 'show interfaces description'
-            shell.send(sent_cmd + '\n')
-        time.sleep(1)
-        int_output = ''
-        prompt_found = False
-        max_loops = 20
-        prompt_patterns = ['>', '#']
-        for _ in range(max_loops):
-            time.sleep(0.5)
-            try:
-                chunk = shell.recv(65535).decode('utf-8')
-            except Exception:
-                break
-            int_output += chunk
-            if '--More--' in chunk:
-                shell.send(' ')
-            if any(chunk.strip().endswith(p) for p in prompt_patterns):
-                prompt_found = True
-                break
-        if not prompt_found:
-            print(f"Warning: Prompt not detected for {host_name} (interfaces). Output may be incomplete.")
-        # Parse interface descriptions
-        interfaces = {}
-        lines = int_output.splitlines()
-        # If Cisco, try to find header line to compute column positions
-        if is_cisco:
-            # If textfsm is available, prefer structured parsing
-            if HAVE_TEXTFSM:
-                tpl = r"""
-Value INTERFACE (\S+)
-Value STATUS (.+?)
-Value PROTOCOL (.+?)
-Value DESCRIPTION (.*)
-
-Start
-  ^\s*Interface\s+Status\s+Protocol\s+Description -> Start
-  ^\s*${INTERFACE}\s+${STATUS}\s+${PROTOCOL}\s+${DESCRIPTION} -> Record
-"""
-                try:
-                    fsm = textfsm.TextFSM(io.StringIO(tpl))
-                    parsed = fsm.ParseText(int_output)
-                    for row in parsed:
-                        vals = dict(zip(fsm.header, row))
-                        iface = vals.get('INTERFACE')
-                        interfaces[iface] = {"admin_status": vals.get('STATUS',''),
-                                             "oper_status": vals.get('PROTOCOL',''),
-                                             "description": (vals.get('DESCRIPTION') or '').strip()}
-                    # if we parsed anything, skip further parsing
-                    if interfaces:
-                        # parsed via textfsm
-                        pass
-                except Exception:
-                    # fallback to positional parsing below
-                    pass
-
-            header_idx = None
-            for i, l in enumerate(lines):
-                if l and 'interface' in l.lower() and 'status' in l.lower() and 'protocol' in l.lower():
-                    header_idx = i
-                    header_line = l
-                    break
-            if header_idx is not None:
-                # determine column starts
-                iface_start = header_line.lower().find('interface')
-                status_start = header_line.lower().find('status')
-                proto_start = header_line.lower().find('protocol')
-                desc_start = header_line.lower().find('description')
-                # debug print of header positions when DEBUG env var set
-                import os as _os
-                if _os.getenv('DEBUG_INT_PARSE'):
-                    print(f"Header line: {repr(header_line)}")
-                    print(f"Cols -> iface:{iface_start} status:{status_start} proto:{proto_start} desc:{desc_start}")
-                if desc_start == -1:
-                    # description may be at end; set to proto_start + 8
-                    desc_start = proto_start + 8 if proto_start != -1 else None
-                for l in lines[header_idx+1:]:
-                    if not l:
-                        continue
-                    lowl = l.lower()
-                    # skip paging, command echoes and error messages
-                    if '--more--' in lowl or lowl.startswith('%') or lowl.strip().startswith(sent_cmd):
-                        continue
-                    # ensure line is long enough
-                    try:
-                        iface = l[iface_start:status_start].strip() if status_start != -1 else l.split()[0]
-                        admin = l[status_start:proto_start].strip() if (status_start != -1 and proto_start != -1) else ''
-                        oper = l[proto_start:desc_start].strip() if (proto_start != -1 and desc_start is not None) else ''
-                        desc = l[desc_start:].strip() if desc_start is not None and desc_start < len(l) else ''
-                    except Exception:
-                        parts = re.split(r"\s+", l, maxsplit=3)
-                        if len(parts) >= 3:
-                            iface, admin, oper = parts[0].strip(), parts[1].strip(), parts[2].strip()
-                            desc = parts[3].strip() if len(parts) > 3 else ''
-                        else:
-                            continue
-                    if iface:
-                        interfaces[iface] = {"admin_status": admin, "oper_status": oper, "description": desc}
+            entry = health.get(hostname)
+            skipped.append((hostname, ip, f"circuit open after {entry['consecutive_failures']} failures "
+                                          f"({entry.get('last_error', '')}), next try after "
+                                          f"{health.retry_at(hostname):%Y-%m-%d %H:%M}"))
+    # Longest expected collection first, so the slowest stacks do not start last and set the
+    # run time (hosts.txt order is kept with a single worker)
+    expected = {h: health.expected_duration(h[1]) for h in targets}
+    ordered, estimate = longest_first(targets, expected, workers)
+    if workers > 1:
+        targets = ordered
+    unknown = sum(1 for seconds in expected.values() if seconds is None)
+    slots = min(workers, len(targets)) or 1
+    print(f"Estimated runtime: {int(estimate // 60)}m{int(estimate % 60):02d}s for {len(targets)} hosts on "
+          f"{slots} worker{'s' if slots > 1 else ''}" + (f" ({unknown} without history)" if unknown else ""))
+    if deadline is not None and estimate > deadline - time.monotonic():
+        print(f"Warning: the estimate runs past --deadline {args.deadline}; the last hosts to start will be skipped")
+    # With --parse-processes the raw tables go to worker processes, one parser thread per process
+    pool = ParserPool(args.parse_processes) if args.parse_processes > 0 else None
+    parse_threads = args.parse_processes if pool else 1
+    parse_fn = pool.parse if pool else parse
+    if args.backend == 'asyncio':
+        if agent_socket:
+            print("Note: --agent is ignored by the asyncio backend")
+        if args.batch:
+            print("Note: --batch is ignored by the asyncio backend")
+        if args.junos != 'cli':
+            print("Note: --junos is ignored by the asyncio backend")
+        fleet = dict(zip(targets, fetch_hosts_asyncio(targets, device_user, device_pass, workers,
+                                                      args.host_timeout, idle_timeout=args.idle_timeout or 10,
+                                                      extra_commands=extra_commands, deadline=deadline,
+                                                      grace=args.deadline_grace)))
+        deadline = None  # already applied by async_collector
+
+        def fetch(h):
+            ok, result = fleet.pop(h)
+            if not ok:
+                raise RuntimeError(result)
+            return result
+        collectors = 1
+    else:
+        def fetch(h):
+            # Timeouts from the host's own latency history unless given on the command line
+            connect_timeout, idle_timeout, _ = health.timeouts(h[1])
+            started = time.monotonic()
+            fetched = fetch_host(h[0], h[1], device_user, device_pass, debug=DEBUG_MODE,
+                                 idle_timeout=args.idle_timeout or idle_timeout, extra_commands=extra_commands,
+                                 agent_socket=agent_socket, batch=args.batch, junos=args.junos, cache=cache,
+                                 stream=not pool, connect_timeout=args.connect_timeout or connect_timeout)
+            fetched['elapsed'] = time.monotonic() - started
+            return fetched
+        collectors = workers
+
+    def parse_stage(h, fetched):
+        # Only the rows as CSV text and what the health record needs travel on to the writer,
+        # which holds them while a host earlier in hosts.txt is still being collected
+        meta = {'elapsed': fetched['elapsed'], 'connect_time': fetched.get('connect_time'),
+                'complete': all(stats.get('prompt_found') for _, _, stats in fetched['results'][:2]),
+                'results': [(command, None, stats) for command, _, stats in fetched['results']]}
+        rows, interfaces, extra_outputs = parse_fetched(h[1], fetched, debug=DEBUG_MODE, parse=parse_fn)
+        desc_rows = ''
+        if args.with_descriptions:
+            desc_rows = csv_text(({"host": h[1], "interface": iface, **vals} for iface, vals in interfaces.items()),
+                                 DESC_FIELDS)
+        return csv_text(rows, CSV_FIELDS), desc_rows, extra_outputs, meta
+
+    # Where each target sits in hosts.txt; hosts not collected in this run (done before a
+    # resume, unreachable, circuit open) hold nothing up
+    position = {}
+    collecting = set(targets)
+    for index, h in enumerate(hosts):
+        if h in collecting:
+            position.setdefault(h, index)
+    not_collected = set(range(len(hosts))) - set(position.values())
+
+    outdir = Path(__file__).parent / "outputs"
+    if args.with_dhcp:
+        outdir.mkdir(parents=True, exist_ok=True)
+    # A resumed run appends to the files of the run it finishes: its hosts follow those done
+    # before the interruption, each part in hosts.txt order
+    mode = "a" if args.resume else "w"
+    with open(partial_filename, mode=mode, newline="") as csvfile, \
+            open(desc_partial if args.with_descriptions else os.devnull, mode=mode, newline="") as descfile:
+        if csvfile.tell() == 0:
+            csv.DictWriter(csvfile, fieldnames=CSV_FIELDS).writeheader()
+        if args.with_descriptions and descfile.tell() == 0:
+            csv.DictWriter(descfile, fieldnames=DESC_FIELDS).writeheader()
+        results = run_pipeline(targets, fetch, parse_stage, collectors=collectors, parsers=parse_threads,
+                               deadline=deadline, grace=args.deadline_grace)
+        for (host_ip, host_name), ok, result in in_order(results, position, skip=not_collected):
+            if not ok and result in (NOT_STARTED, CANCELLED):
+                # Cut off by --deadline, which is not the host's fault
+                skipped.append((host_name, host_ip, result))
+                cut_off += 1
+                continue
+            if not ok:
+                print(f"Failed to connect to {host_name}: {result}")
+                failed.append((host_name, host_ip, result))
+                health.record_failure(host_name, host_ip, result)
+                journal.record(host_name, host_ip, False, result)
+                continue
+            csv_rows, desc_rows, extra_outputs, meta = result
+            collected += 1
+            health.record_latency(host_name, meta['connect_time'], meta['results'])
+            if meta['complete']:
+                health.record_success(host_name, host_ip, meta['elapsed'])
             else:
-                # no header found, fallback to regex/split per-line
-                for line in lines:
-                    l = line.strip()
-                    lowl = l.lower()
-                    # Filter out blank lines, header echoes, paging and command echo or error lines
-                    if not l or lowl.startswith('interface') or '--more--' in lowl or lowl.startswith('%') or lowl.startswith('show '):
-                        continue
-                    cm = cisco_int_pattern.match(l)
-                    if cm:
-                        data = cm.groupdict()
-                        interfaces[data['interface']] = {"admin_status": data.get('admin_status',''),
-                                                         "oper_status": data.get('oper_status',''),
-                                                         "description": (data.get('description') or '').strip()}
-                        continue
-                    parts = re.split(r"\s+", l, maxsplit=3)
-                    if len(parts) >= 3:
-                        iface, admin, oper = parts[0].strip(), parts[1].strip(), parts[2].strip()
-                        desc = parts[3].strip() if len(parts) > 3 else ''
-                        interfaces[iface] = {"admin_status": admin, "oper_status": oper, "description": desc}
+                health.record_failure(host_name, host_ip, 'prompt not detected, output may be incomplete')
+            csvfile.write(csv_rows)
+            csvfile.flush()
+            descfile.write(desc_rows)
+            descfile.flush()
+            if dhcp_command in extra_outputs:
+                (outdir / f"{host_name}_{journal.run_id}.txt").write_text(extra_outputs[dhcp_command])
+                dhcp_saved += 1
+            journal.record(host_name, host_ip, True)
+    if pool:
+        pool.close()
+
+    cache.save()
+    health.save()
+
+    print(f"\nCollected {collected + len(resumed)}/{len(hosts)} hosts successfully"
+          + (f" ({len(resumed)} before the interruption)" if resumed else ""))
+    if cut_off:
+        print(f"Deadline {args.deadline} reached: {cut_off} hosts not collected")
+    for host_name, host_ip, err in failed:
+        print(f"  FAILED {host_name} ({host_ip}): {err}")
+    for host_name, host_ip, reason in skipped:
+        print(f"  SKIPPED {host_name} ({host_ip}): {reason}")
+
+    # ==== Name the CSV after the slot the run started for ====
+    # A run that spills past the hour still belongs to the slot it was started for, and a
+    # resumed run to the slot of the run it finishes. The slot hours live in scheduler.py.
+    timestamp = journal.run_id
+    slot = slot_for(datetime.strptime(journal.run_id, RUN_ID_FORMAT).hour)
+    if slot:
+        suffix = f"_LON.{slot}.csv"
+    else:
+        suffix = "_LON.csv"
+    csv_filename = str(workdir / f"interfaces_and_mac_{timestamp}{suffix}")
+    os.replace(partial_filename, csv_filename)
+    journal.close(complete=True)
+
+    print(f"\nData saved to {csv_filename}")
+    if probes and not args.no_preflight:
+        probe_filename = csv_filename[:-len(".csv")] + "_preflight.csv"
+        write_results(probe_filename, [(hostname, ip) for ip, hostname in hosts_todo], probes)
+        print(f"Pre-flight results saved to {probe_filename}")
+    if skipped:
+        skipped_filename = csv_filename[:-len(".csv")] + "_skipped.csv"
+        with open(skipped_filename, mode="w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["host", "ip", "reason"])
+            writer.writerows(skipped)
+        print(f"Skipped hosts saved to {skipped_filename}")
+
+    if args.with_descriptions:
+        desc_filename = workdir / f"interfaces_description_{timestamp}.csv"
+        if desc_partial.is_file():
+            os.replace(desc_partial, desc_filename)
+            print(f"Descriptions saved to {desc_filename}")
         else:
-            # Juniper or generic: try Juniper regex per line
-            for line in lines:
-                l = line.strip()
-                if not l or l.lower().startswith('interface') or '--more--' in l.lower():
-                    continue
-                match = int_pattern.match(l)
-                if match:
-                    data = match.groupdict()
-                    if data['description'] is None:
-                        data['description'] = ''
-                    interfaces[data['interface']] = {"admin_status": data['admin_status'],
-                                                     "oper_status": data['oper_status'],
-                                                     "description": data['description']}
-    # Get MAC address table
-        shell.send('show mac address-table\n')
-        time.sleep(1)
-        mac_output = ''
-        prompt_found = False
-        for _ in range(max_loops):
-            time.sleep(0.5)
-            try:
-                chunk = shell.recv(65535).decode('utf-8')
-            except Exception:
-                break
-            mac_output += chunk
-            if '--More--' in chunk:
-                shell.send(' ')
-            if any(chunk.strip().endswith(p) for p in prompt_patterns):
-                prompt_found = True
-                break
-        if not prompt_found:
-            print(f"Warning: Prompt not detected for {host_name} (mac). Output may be incomplete.")
-        # Write debug files if requested
-        if DEBUG_MODE:
-            safe = host_name.replace('/', '_')
-            try:
-                with open(f"/tmp/{safe}_int_raw.txt", 'w') as f:
-                    f.write(int_output)
-                with open(f"/tmp/{safe}_mac_raw.txt", 'w') as f:
-                    f.write(mac_output)
-                with open(f"/tmp/{safe}_parse_summary.txt", 'w') as f:
-                    f.write(f"Detected: {'cisco' if is_cisco else ('juniper' if is_juniper else 'unknown')}\n")
-                    f.write(f"Parsed interfaces: {len(interfaces)}\n")
-                    # write sample parsed interfaces
-                    for i, (k, v) in enumerate(interfaces.items()):
-                        if i >= 20:
-                            break
-                        f.write(f"{k} -> {v}\n")
-            except Exception as e:
-                print(f"Failed to write debug files for {host_name}: {e}")
-        # Parse MAC address table and match to interfaces
-        for line in mac_output.splitlines():
-            line = line.strip()
-            if not line or line.lower().startswith("vlan") or "--more--" in line.lower():
-                continue
-            match = mac_pattern.match(line)
-            if match:
-                mac_data = match.groupdict()
-                port = mac_data["port"]
-                if port.upper() == "CPU":
-                    continue
-                entry = {
-                    "host": host_name,
-                    "interface": port,
-                    "admin_status": interfaces.get(port, {}).get("admin_status", ""),
-                    "oper_status": interfaces.get(port, {}).get("oper_status", ""),
-                    "description": interfaces.get(port, {}).get("description", ""),
-                    "mac address": mac_data["mac"],
-                    "vlan": mac_data["vlan"]
-                }
-                all_data.append(entry)
-    except Exception as e:
-        print(f"Failed to connect to {host_name}: {e}")
-    finally:
-        client.close()
-
-# ==== Write data to CSV with timestamp ====
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-hour = datetime.now().hour
-if hour in (0, 20):
-    suffix = "_LON.BASE.csv"
-elif hour in (5, 9, 10, 14):
-    suffix = "_LON.DAYTIME.csv"
-else:
-    suffix = "_LON.csv"
-csv_filename = f"interfaces_and_mac_{timestamp}{suffix}"
-with open(csv_filename, mode="w", newline="") as csvfile:
-    fieldnames = ["host", "interface", "admin_status", "oper_status", "description", "mac address", "vlan"]
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-    writer.writeheader()
-    for row in all_data:
-        writer.writerow(row)
-
-print(f"\nData saved to {csv_filename}")
+            print(f"Warning: {desc_partial} is missing, no descriptions saved")
+
+    if args.with_dhcp:
+        print(f"DHCP sections for {dhcp_saved} hosts saved to {outdir}")
+
+    # Runs that attached to this one pick the CSV up from here
+    lock.finish({'run_id': journal.run_id, 'result': str(Path(csv_filename).resolve()),
+                 'collected': collected + len(resumed), 'hosts': len(hosts)})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+ssh_agent.py
+
+Long-lived local agent that keeps authenticated SSH sessions to the switches open
+between scheduled runs, so collectors skip TCP, key exchange and login.
+
+The agent reads credentials.txt.enc / secret.key from this folder, sends transport
+keepalives, reconnects sessions that drop, closes sessions left idle too long,
+and serves requests on a Unix socket (default: ./ssh_agent.sock, mode 0600).
+
+Protocol: one JSON object per line in each direction.
+  {"op": "open", "host": "10.0.0.1"}
+      -> {"ok": true, "platform": "cisco", "prompt": "SW1#"}
+  {"op": "run", "host": "10.0.0.1", "commands": ["show version"], "idle_timeout": 10, "batch": false}
+      -> {"ok": true, "platform": "cisco", "results": [{"command": ..., "output": ..., "stats": {...}}]}
+  {"op": "close", "host": "10.0.0.1"}   {"op": "status"}
+Errors come back as {"ok": false, "error": "..."}.
+
+Usage:
+  python3 ssh_agent.py [--socket ssh_agent.sock] [--keepalive 30] [--idle-close 7200]
+
+Collectors attach with --agent (see sh_int_and_sh_mac.py) through AgentSession,
+which has the same interface as ssh_session.SSHSession.
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+from cryptography.fernet import Fernet
+from ssh_session import SSHSession
+
+DEFAULT_SOCKET = Path(__file__).parent / 'ssh_agent.sock'
+
+
+def load_creds(base: Path):
+    enc = base / 'credentials.txt.enc'
+    keyf = base / 'secret.key'
+    if not enc.exists() or not keyf.exists():
+        print('Missing credentials or key')
+        sys.exit(2)
+    key = keyf.read_bytes()
+    f = Fernet(key)
+    data = f.decrypt(enc.read_bytes()).decode('utf-8')
+    creds = {}
+    for l in data.splitlines():
+        l = l.strip()
+        if not l or l.startswith('#'):
+            continue
+        if '=' in l:
+            k, v = l.split('=', 1)
+            creds[k.strip()] = v.strip()
+    return creds
+
+
+class SessionPool:
+    """Open SSHSessions keyed by host IP, each guarded by its own lock."""
+
+    def __init__(self, user, password, keepalive=30, idle_close=7200):
+        self.user = user
+        self.password = password
+        self.keepalive = keepalive
+        self.idle_close = idle_close
+        self.lock = threading.Lock()
+        self.sessions = {}   # host -> SSHSession
+        self.host_locks = {}
+        self.last_used = {}
+
+    def _host_lock(self, host):
+        with self.lock:
+            return self.host_locks.setdefault(host, threading.Lock())
+
+    def _connect(self, host):
+        session = SSHSession(host, self.user, self.password, keepalive=self.keepalive)
+        try:
+            session.open()
+        except Exception:
+            session.close()
+            raise
+        print(f"[agent] connected {host} ({session.platform})")
+        return session
+
+    def _get(self, host):
+        """Return a live session for host, reconnecting if it dropped. Caller holds the host lock."""
+        session = self.sessions.get(host)
+        if session is not None and not session.is_alive():
+            print(f"[agent] session to {host} dropped, reconnecting")
+            session.close()
+            session = None
+        if session is None:
+            session = self._connect(host)
+            self.sessions[host] = session
+        self.last_used[host] = time.monotonic()
+        return session
+
+    def open(self, host):
+        with self._host_lock(host):
+            session = self._get(host)
+            return {'platform': session.platform, 'prompt': session.prompt}
+
+    def run(self, host, commands, idle_timeout=None, batch=False):
+        with self._host_lock(host):
+            session = self._get(host)
+            run = SSHSession.run_batch if batch else SSHSession.run_many
+            try:
+                # Anything left on the channel since the last request (keepalive chatter,
+                # a late tail) would otherwise be read as this request's output
+                session.drain(quiet=0)
+                results = run(session, commands, idle_timeout=idle_timeout)
+            except Exception as e:
+                # The channel broke mid-command; reconnect once and retry on a fresh session
+                print(f"[agent] {host}: {e}; reconnecting and retrying")
+                session.close()
+                self.sessions.pop(host, None)
+                session = self._get(host)
+                results = run(session, commands, idle_timeout=idle_timeout)
+            self.last_used[host] = time.monotonic()
+            if not all(stats.get('prompt_found') for _, _, stats in results):
+                # An incomplete read may leave the session out of step with the device;
+                # the next request gets a fresh login instead
+                print(f"[agent] {host}: incomplete output, dropping the session")
+                session.close()
+                self.sessions.pop(host, None)
+            return session.platform, results
+
+    def close(self, host):
+        with self._host_lock(host):
+            session = self.sessions.pop(host, None)
+            if session is not None:
+                session.close()
+
+    def status(self):
+        now = time.monotonic()
+        with self.lock:
+            hosts = list(self.sessions.items())
+        return [{'host': h, 'platform': s.platform, 'alive': s.is_alive(),
+                 'idle': round(now - self.last_used.get(h, now), 1)} for h, s in hosts]
+
+    def maintain(self):
+        """Reconnect dropped sessions and close ones unused for idle_close seconds."""
+        now = time.monotonic()
+        with self.lock:
+            hosts = list(self.sessions)
+        for host in hosts:
+            lock = self._host_lock(host)
+            if not lock.acquire(blocking=False):
+                continue  # busy running a command, so it is alive
+            try:
+                session = self.sessions.get(host)
+                if session is None:
+                    continue
+                if now - self.last_used.get(host, now) > self.idle_close:
+                    print(f"[agent] closing idle session to {host}")
+                    session.close()
+                    self.sessions.pop(host, None)
+                elif not session.is_alive():
+                    print(f"[agent] session to {host} dropped, reconnecting")
+                    session.close()
+                    self.sessions.pop(host, None)
+                    try:
+                        self.sessions[host] = self._connect(host)
+                    except Exception as e:
+                        print(f"[agent] reconnect to {host} failed: {e}")
+            finally:
+                lock.release()
+
+    def close_all(self):
+        with self.lock:
+            hosts = list(self.sessions)
+        for host in hosts:
+            self.close(host)
+
+
+class AgentHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        pool = self.server.pool
+        for raw in self.rfile:
+            try:
+                req = json.loads(raw)
+                op = req.get('op')
+                if op == 'open':
+                    resp = {'ok': True, **pool.open(req['host'])}
+                elif op == 'run':
+                    platform, results = pool.run(req['host'], req.get('commands', []), req.get('idle_timeout'),
+                                                 batch=bool(req.get('batch')))
+                    resp = {'ok': True, 'platform': platform,
+                            'results': [{'command': c, 'output': o, 'stats': s} for c, o, s in results]}
+                elif op == 'close':
+                    pool.close(req['host'])
+                    resp = {'ok': True}
+                elif op == 'status':
+                    resp = {'ok': True, 'sessions': pool.status()}
+                else:
+                    resp = {'ok': False, 'error': f"unknown op {op!r}"}
+            except Exception as e:
+                resp = {'ok': False, 'error': str(e)}
+            self.wfile.write((json.dumps(resp) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, pool):
+        self.pool = pool
+        super().__init__(str(socket_path), AgentHandler)
+
+
+def serve(socket_path, pool, keepalive=30):
+    socket_path = Path(socket_path)
+    if socket_path.exists():
+        if agent_available(socket_path):
+            print(f"Agent already running on {socket_path}")
+            sys.exit(1)
+        socket_path.unlink()  # stale socket from a previous agent
+    old_umask = os.umask(0o177)
+    try:
+        server = AgentServer(socket_path, pool)
+    finally:
+        os.umask(old_umask)
+
+    stop = threading.Event()
+
+    def maintenance():
+        while not stop.wait(max(1, keepalive)):
+            pool.maintain()
+
+    threading.Thread(target=maintenance, daemon=True).start()
+    print(f"[agent] listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        pool.close_all()
+        try:
+            socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# ==== Client side ====
+
+def agent_request(request, socket_path=DEFAULT_SOCKET, timeout=None):
+    """Send one request to the agent and return the decoded response dict."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(str(socket_path))
+        with s.makefile('rwb') as f:
+            f.write((json.dumps(request) + '\n').encode('utf-8'))
+            f.flush()
+            line = f.readline()
+    if not line:
+        raise ConnectionError('agent closed the connection')
+    resp = json.loads(line)
+    if not resp.get('ok'):
+        raise RuntimeError(f"agent: {resp.get('error')}")
+    return resp
+
+
+def agent_available(socket_path=DEFAULT_SOCKET):
+    """True if an agent answers on socket_path."""
+    try:
+        agent_request({'op': 'status'}, socket_path, timeout=2)
+        return True
+    except Exception:
+        return False
+
+
+class AgentSession:
+    """Drop-in for ssh_session.SSHSession that runs commands through the agent.
+
+    open()/close() do not log in or out: the agent owns the connection and
+    keeps it for the next run.
+    """
+
+    def __init__(self, host_ip, socket_path=DEFAULT_SOCKET, idle_timeout=10):
+        self.host_ip = host_ip
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.platform = 'unknown'
+        self.prompt = None
+
+    def open(self):
+        resp = agent_request({'op': 'open', 'host': self.host_ip}, self.socket_path)
+        self.platform = resp.get('platform', 'unknown')
+        self.prompt = resp.get('prompt')
+        return self
+
+    def run_many(self, commands, idle_timeout=None, batch=False):
+        if idle_timeout is None:
+            idle_timeout = self.idle_timeout
+        resp = agent_request({'op': 'run', 'host': self.host_ip, 'commands': list(commands),
+                              'idle_timeout': idle_timeout, 'batch': batch}, self.socket_path)
+        self.platform = resp.get('platform', self.platform)
+        return [(r['command'], r['output'], r['stats']) for r in resp['results']]
+
+    def run_batch(self, commands, idle_timeout=None):
+        return self.run_many(commands, idle_timeout=idle_timeout, batch=True)
+
+    def run(self, command, idle_timeout=None, max_time=None, stats=None):
+        [(_, output, result_stats)] = self.run_many([command], idle_timeout=idle_timeout)
+        if stats is not None:
+            stats.update(result_stats)
+        return output, bool(result_stats.get('prompt_found'))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Persistent SSH session agent')
+    parser.add_argument('--socket', default=str(DEFAULT_SOCKET), help='Unix socket path (default: ./ssh_agent.sock)')
+    parser.add_argument('--keepalive', type=int, default=30, help='Seconds between keepalives/health checks (default: 30)')
+    parser.add_argument('--idle-close', type=int, default=7200,
+                        help='Close sessions unused for this many seconds (default: 7200)')
+    parser.add_argument('--status', action='store_true', help='Print the sessions held by a running agent and exit')
+    args = parser.parse_args()
+
+    if args.status:
+        for s in agent_request({'op': 'status'}, args.socket)['sessions']:
+            print(f"{s['host']:<16} {s['platform']:<8} alive={s['alive']} idle={s['idle']}s")
+        return
+
+    creds = load_creds(Path(__file__).parent)
+    if 'device_user' not in creds or 'device_pass' not in creds:
+        print('Missing device_user/device_pass in credentials')
+        sys.exit(2)
+    pool = SessionPool(creds['device_user'], creds['device_pass'],
+                       keepalive=args.keepalive, idle_close=args.idle_close)
+    serve(args.socket, pool, keepalive=args.keepalive)
+
+
+if __name__ == '__main__':
+    main()
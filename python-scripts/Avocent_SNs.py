@@ -6,6 +6,7 @@ import argparse
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from cryptography.fernet import Fernet
+from preflight import sweep, write_results, PROBE_TIMEOUT
 logging.basicConfig(filename='avocent_sn.log', level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 
 # --- Replace with your actual decryption logic ---
@@ -40,6 +41,53 @@ def get_hosts(hosts_file):
                     hosts.append((parts[0], ip))  # (device_name, ip)
     return hosts
 
+# Commands tried in order; the first output with a serial number wins
+AVOCENT_COMMANDS = ['cd system/information', 'show', 'show system/information', 'show chassis hardware']
+# The Avocent prompt carries the current directory ('--:- / cli->', then '--:- information cli->'),
+# so match its fixed 'cli->' end, or a JunOS 'user@host>' for the chassis fallback
+AVOCENT_PROMPT_RE = re.compile(r'(?:cli->|@\S+[>#])\s*$')
+
+
+def ping_status(host):
+    """Reachability label used when SSH fails."""
+    import subprocess
+    try:
+        ping_cmd = ["ping", "-c", "2", "-W", "2", host]
+        result = subprocess.run(ping_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode == 0:
+            return 'no SSH and yes ICMP'
+        else:
+            return 'no SSH and no ICMP'
+    except Exception as e2:
+        logging.error(f"ICMP ping failed for {host}: {e2}")
+        return 'no SSH and no ICMP'
+
+
+def find_avocent_serial(output):
+    match = re.search(r'serial number: (\S+)', output)
+    return match.group(1) if match else ''
+
+
+def parse_chassis_serial(junos_output):
+    # Parse for Chassis line
+    serial = ''
+    for line in junos_output.splitlines():
+        line = line.strip()
+        # Match line starting with 'Chassis' and having a serial number column
+        if line.startswith('Chassis'):
+            # Example: Chassis                                NV3620210374      EX3400-24T
+            match = re.match(r'^Chassis\s+(\S+)\s+(\S+)$', line)
+            if match:
+                serial = match.group(1)
+                break
+            # Fallback: split and get the second non-empty value
+            parts = [p for p in line.split() if p]
+            if len(parts) >= 3:
+                serial = parts[-2]
+                break
+    return serial
+
+
     # (removed duplicate, unindented get_serial_number definition)
 def get_serial_number(host, username, password, dry_run=False):
     if dry_run:
@@ -55,17 +103,7 @@ def get_serial_number(host, username, password, dry_run=False):
     except Exception as e:
         logging.error(f"SSH connection failed for {host}: {e}")
         # If SSH fails, run ICMP ping
-        import subprocess
-        try:
-            ping_cmd = ["ping", "-c", "2", "-W", "2", host]
-            result = subprocess.run(ping_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            if result.returncode == 0:
-                return '', 'no SSH and yes ICMP'
-            else:
-                return '', 'no SSH and no ICMP'
-        except Exception as e2:
-            logging.error(f"ICMP ping failed for {host}: {e2}")
-            return '', 'no SSH and no ICMP'
+        return '', ping_status(host)
     try:
         shell = ssh.invoke_shell()
         def read_until_prompt(prompt="cli->", timeout=10):
@@ -106,11 +144,11 @@ def get_serial_number(host, username, password, dry_run=False):
 
         # Try Avocent serial extraction first
         output = out1 + out2
-        match = re.search(r'serial number: (\S+)', output)
-        if match:
-            logging.info(f"Serial number for {host}: {match.group(1)}")
+        serial = find_avocent_serial(output)
+        if serial:
+            logging.info(f"Serial number for {host}: {serial}")
             ssh.close()
-            return match.group(1), 'yes'
+            return serial, 'yes'
 
         # If not found, try 'show system/information' as a second option
         print(f"[DEBUG] Trying 'show system/information' for {host}")
@@ -118,11 +156,11 @@ def get_serial_number(host, username, password, dry_run=False):
         out3 = read_until_prompt()
         print(f"[DEBUG] After show system/information: {out3}")
         logging.debug(f"After show system/information: {out3}")
-        match2 = re.search(r'serial number: (\S+)', out3)
-        if match2:
-            logging.info(f"Serial number for {host} (show system/information): {match2.group(1)}")
+        serial = find_avocent_serial(out3)
+        if serial:
+            logging.info(f"Serial number for {host} (show system/information): {serial}")
             ssh.close()
-            return match2.group(1), 'yes'
+            return serial, 'yes'
 
         # If still not found, try JunOS extraction
         print(f"[DEBUG] Trying JunOS serial extraction for {host}")
@@ -140,22 +178,7 @@ def get_serial_number(host, username, password, dry_run=False):
             except Exception:
                 break
         ssh.close()
-        # Parse for Chassis line
-        serial = ''
-        for line in junos_output.splitlines():
-            line = line.strip()
-            # Match line starting with 'Chassis' and having a serial number column
-            if line.startswith('Chassis'):
-                # Example: Chassis                                NV3620210374      EX3400-24T
-                match = re.match(r'^Chassis\s+(\S+)\s+(\S+)$', line)
-                if match:
-                    serial = match.group(1)
-                    break
-                # Fallback: split and get the second non-empty value
-                parts = [p for p in line.split() if p]
-                if len(parts) >= 3:
-                    serial = parts[-2]
-                    break
+        serial = parse_chassis_serial(junos_output)
         if serial:
             logging.info(f"JunOS serial number for {host}: {serial}")
             return serial, 'yes'
@@ -166,6 +189,34 @@ def get_serial_number(host, username, password, dry_run=False):
         logging.error(f"Error during SSH session for {host}: {e}")
         return '', 'yes'
 
+def get_serial_numbers_asyncio(hosts, username, password, concurrency):
+    """asyncio backend: all console servers on one event loop via async_collector.
+
+    Every command in AVOCENT_COMMANDS runs on each host (one login); the serial is
+    taken from the first output that has one, in the same order as get_serial_number().
+    """
+    from async_collector import run_fleet
+    ips = [ip for _, ip in hosts]
+    fleet = run_fleet(ips, username, password, AVOCENT_COMMANDS, concurrency=concurrency,
+                      host_timeout=120, idle_timeout=10, setup_commands=[], prompt_re=AVOCENT_PROMPT_RE)
+    results = []
+    for (device_name, ip), (ok, fleet_result) in zip(hosts, fleet):
+        if not ok:
+            logging.error(f"SSH session failed for {ip}: {fleet_result}")
+            results.append((device_name, ip, '', ping_status(ip)))
+            continue
+        outputs = {cmd: output for cmd, output, _ in fleet_result['results']}
+        serial = (find_avocent_serial(outputs['cd system/information'] + outputs['show'])
+                  or find_avocent_serial(outputs['show system/information'])
+                  or parse_chassis_serial(outputs['show chassis hardware']))
+        if serial:
+            logging.info(f"Serial number for {ip}: {serial}")
+        else:
+            logging.warning(f"Serial number not found for {ip}.")
+        results.append((device_name, ip, serial, 'yes'))
+    return results
+
+
 def main():
     parser = argparse.ArgumentParser(description="Avocent SN Collector")
     parser.add_argument('--dry-run', action='store_true', help='Only print which SSH connections would be attempted, do not connect.')
@@ -173,6 +224,13 @@ def main():
     parser.add_argument('--hosts', default='Hosts-OOB.txt', help='Hosts file (default: Hosts-OOB.txt)')
     parser.add_argument('--key', default='secret.OOB.key', help='Fernet key file (default: secret.OOB.key)')
     parser.add_argument('--output', default='avocent_serials.csv', help='Output CSV file (default: avocent_serials.csv)')
+    parser.add_argument('--backend', choices=['threads', 'asyncio'], default='threads',
+                        help='threads: paramiko worker pool; asyncio: async_collector (asyncssh)')
+    parser.add_argument('--workers', type=int, default=10, help='Hosts in parallel (default: 10)')
+    parser.add_argument('--no-preflight', action='store_true',
+                        help='Skip the TCP/22 reachability sweep and try SSH on every host')
+    parser.add_argument('--probe-timeout', type=float, default=PROBE_TIMEOUT,
+                        help=f'Seconds to wait for TCP/22 in the pre-flight sweep (default: {PROBE_TIMEOUT})')
     args = parser.parse_args()
 
     # Read Fernet key from file
@@ -180,7 +238,18 @@ def main():
         key = kf.read().strip()
         username, password = decrypt_credentials_file(args.credentials, key)
     hosts = get_hosts(args.hosts)
+    all_hosts = hosts
     results = []
+    # Pre-flight: probe TCP/22 on every host at once; hosts that do not answer skip SSH and only get the ping check
+    probes = {}
+    if not args.dry_run and not args.no_preflight:
+        probes = sweep([ip for _, ip in hosts], timeout=args.probe_timeout)
+        down = [(device_name, ip) for device_name, ip in hosts if not probes[ip]['reachable']]
+        hosts = [(device_name, ip) for device_name, ip in hosts if probes[ip]['reachable']]
+        logging.info(f"Pre-flight: {len(hosts)}/{len(all_hosts)} hosts answer on tcp/22")
+        print(f"Pre-flight: {len(hosts)}/{len(all_hosts)} hosts answer on tcp/22")
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results.extend(executor.map(lambda h: (h[0], h[1], '', ping_status(h[1])), down))
     def process_device(device_name, ip):
         try:
             serial, alive = get_serial_number(ip, username, password, dry_run=args.dry_run)
@@ -188,11 +257,14 @@ def main():
             serial, alive = f'ERROR: {e}', 'no SSH and no ICMP'
         return (device_name, ip, serial, alive)
 
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_device = {executor.submit(process_device, device_name, ip): (device_name, ip) for device_name, ip in hosts}
-        for future in as_completed(future_to_device):
-            device_name, ip, serial, alive = future.result()
-            results.append((device_name, ip, serial, alive))
+    if args.backend == 'asyncio' and not args.dry_run:
+        results.extend(get_serial_numbers_asyncio(hosts, username, password, args.workers))
+    else:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            future_to_device = {executor.submit(process_device, device_name, ip): (device_name, ip) for device_name, ip in hosts}
+            for future in as_completed(future_to_device):
+                device_name, ip, serial, alive = future.result()
+                results.append((device_name, ip, serial, alive))
 
     with open(args.output, 'w', newline='') as csvfile:
         writer = csv.writer(csvfile)
@@ -201,6 +273,11 @@ def main():
             writer.writerow(row)
     logging.info(f"Serial numbers saved to {args.output}")
     print(f"Serial numbers saved to {args.output}")
+    if probes:
+        probe_output = args.output[:-len('.csv')] + '_preflight.csv' if args.output.endswith('.csv') \
+            else args.output + '_preflight.csv'
+        write_results(probe_output, all_hosts, probes)
+        print(f"Pre-flight results saved to {probe_output}")
 
 if __name__ == '__main__':
     main()
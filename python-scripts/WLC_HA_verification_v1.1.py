@@ -1,11 +1,14 @@
 
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
 import logging
+import re
 import pexpect
 import csv
 import time
 import os
 from cryptography.fernet import Fernet
+from preflight import sweep, PROBE_TIMEOUT
 
 def load_encrypted_creds():
     key_path = os.path.join(os.path.dirname(__file__), "secret.key")
@@ -29,8 +32,17 @@ def load_encrypted_creds():
         raise Exception("Missing username or password in decrypted credentials.")
     return username, password
 
-def analyze_wlc(ip, username, password):
-    result = {
+# (result field, command) pairs collected after 'show version'
+WLC_COMMANDS = [
+    ("ha_summary", "show redundancy"),
+    ("wireless_state", "show wireless summary"),
+    ("mobility_summary", "sh wireless  mobility controller ap"),
+    ("mobility_anchor", "sh wireless  mobility controller client summary"),
+]
+
+
+def new_result(ip):
+    return {
         "ip": ip,
         "model": "",
         "serial_number": "",
@@ -42,6 +54,25 @@ def analyze_wlc(ip, username, password):
         "error": ""
     }
 
+
+def parse_version(result, version_output):
+    # Extract model from 'Model Number' line
+    model_match = re.search(r"Model Number\s*:\s*(\S+)", version_output)
+    if model_match:
+        result["model"] = model_match.group(1)
+    else:
+        result["model"] = "Unknown"
+    # Extract serial number from 'System Serial Number' line
+    serial_match = re.search(r"System Serial Number\s*:\s*(\S+)", version_output)
+    if serial_match:
+        result["serial_number"] = serial_match.group(1)
+    else:
+        result["serial_number"] = "Unknown"
+
+
+def analyze_wlc(ip, username, password):
+    result = new_result(ip)
+
     try:
         logging.info(f"Connecting to {ip} ...")
         ssh_cmd = f"ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null {username}@{ip}"
@@ -77,24 +108,9 @@ def analyze_wlc(ip, username, password):
             return output
 
         version_output = run_command("show version")
-        # Extract model from 'Model Number' line
-        import re
-        model_match = re.search(r"Model Number\s*:\s*(\S+)", version_output)
-        if model_match:
-            result["model"] = model_match.group(1)
-        else:
-            result["model"] = "Unknown"
-        # Extract serial number from 'System Serial Number' line
-        serial_match = re.search(r"System Serial Number\s*:\s*(\S+)", version_output)
-        if serial_match:
-            result["serial_number"] = serial_match.group(1)
-        else:
-            result["serial_number"] = "Unknown"
-
-        result["ha_summary"] = run_command("show redundancy").strip()
-        result["wireless_state"] = run_command("show wireless summary").strip()
-        result["mobility_summary"] = run_command("sh wireless  mobility controller ap").strip()
-        result["mobility_anchor"] = run_command("sh wireless  mobility controller client summary").strip()
+        parse_version(result, version_output)
+        for field, cmd in WLC_COMMANDS:
+            result[field] = run_command(cmd).strip()
 
         child.sendline("exit")
         child.close()
@@ -105,7 +121,39 @@ def analyze_wlc(ip, username, password):
         result["error"] = str(e)
     return result
 
+
+def analyze_wlcs_asyncio(hosts, username, password, concurrency):
+    """asyncio backend: one event loop drives every WLC through async_collector."""
+    from async_collector import run_fleet
+    commands = ["show version"] + [cmd for _, cmd in WLC_COMMANDS]
+    fleet = run_fleet(hosts, username, password, commands, concurrency=concurrency,
+                      host_timeout=300, idle_timeout=20, setup_commands=["ter len 0"])
+    results = []
+    for ip, (ok, fleet_result) in zip(hosts, fleet):
+        result = new_result(ip)
+        if not ok:
+            logging.error(f"Error: {ip}: {fleet_result}")
+            result["error"] = fleet_result
+        else:
+            outputs = {cmd: output for cmd, output, _ in fleet_result["results"]}
+            parse_version(result, outputs["show version"])
+            for field, cmd in WLC_COMMANDS:
+                result[field] = outputs[cmd].strip()
+        results.append(result)
+    return results
+
+
 def main():
+    parser = argparse.ArgumentParser(description="WLC HA verification")
+    parser.add_argument('--backend', choices=['threads', 'asyncio'], default='threads',
+                        help='threads: pexpect worker pool; asyncio: async_collector (asyncssh)')
+    parser.add_argument('--workers', type=int, default=4, help='Hosts in parallel (default: 4)')
+    parser.add_argument('--no-preflight', action='store_true',
+                        help='Skip the TCP/22 reachability sweep and try SSH on every WLC')
+    parser.add_argument('--probe-timeout', type=float, default=PROBE_TIMEOUT,
+                        help=f'Seconds to wait for TCP/22 in the pre-flight sweep (default: {PROBE_TIMEOUT})')
+    args = parser.parse_args()
+
     # Read hosts from Hosts-WLCs.txt
     hosts = []
     try:
@@ -122,24 +170,39 @@ def main():
         print("No hosts found in Hosts-WLCs.txt.")
         return
 
-    print("Running analysis for all WLC IPs (up to 4 in parallel):")
+    print(f"Running analysis for all WLC IPs (up to {args.workers} in parallel):")
     try:
         username, password = load_encrypted_creds()
     except Exception as e:
         print(f"Failed to load encrypted credentials: {e}")
         return
     results = []
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        future_to_ip = {executor.submit(analyze_wlc, ip, username, password): ip for ip in hosts}
-        for idx, future in enumerate(as_completed(future_to_ip), 1):
-            ip = future_to_ip[future]
-            try:
-                result = future.result()
-            except Exception as exc:
-                print(f"{idx}: {ip} generated an exception: {exc}")
-                result = {"ip": ip, "error": str(exc)}
-            print(f"{idx}: {ip}")
-            results.append(result)
+    # Pre-flight: probe TCP/22 on every WLC at once; those that do not answer are reported without a login
+    if not args.no_preflight:
+        probes = sweep(hosts, timeout=args.probe_timeout)
+        for ip in hosts:
+            if not probes[ip]['reachable']:
+                result = new_result(ip)
+                result["error"] = f"tcp/22 unreachable ({probes[ip]['error']})"
+                logging.error(f"Error: {ip}: {result['error']}")
+                results.append(result)
+        hosts = [ip for ip in hosts if probes[ip]['reachable']]
+    if args.backend == 'asyncio':
+        results += analyze_wlcs_asyncio(hosts, username, password, args.workers)
+        for idx, result in enumerate(results, 1):
+            print(f"{idx}: {result['ip']}")
+    else:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            future_to_ip = {executor.submit(analyze_wlc, ip, username, password): ip for ip in hosts}
+            for idx, future in enumerate(as_completed(future_to_ip), 1):
+                ip = future_to_ip[future]
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    print(f"{idx}: {ip} generated an exception: {exc}")
+                    result = {"ip": ip, "error": str(exc)}
+                print(f"{idx}: {ip}")
+                results.append(result)
 
     # Save all results to a single CSV file (overwrite each run)
     csv_fields = ["ip", "model", "serial_number", "ha_summary", "wireless_state", "mobility_summary", "mobility_anchor", "timestamp", "error"]
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+async_collector.py
+
+asyncio collection engine built on asyncssh. One event loop keeps hundreds of
+device sessions in flight on a single core: a global semaphore caps how many
+hosts are connected at once, and every host gets its own overall timeout so a
+hung switch cannot hold a slot forever. With a deadline, hosts still waiting
+for a slot when it passes are not started and hosts still running `grace`
+seconds later are cancelled (pipeline.NOT_STARTED / pipeline.CANCELLED).
+
+Prompt learning, paging and platform detection follow ssh_session.py, so the
+outputs match what the threaded collectors get from SSHSession.
+
+    results = run_fleet(['10.0.0.1', '10.0.0.2'], user, password,
+                        ['show interfaces description', 'show mac address-table'],
+                        concurrency=200, host_timeout=300)
+    for ok, result in results:   # same order as the host list
+        if ok:
+            result['platform'], result['results']  # [(command, output, stats), ...]
+        else:
+            result  # error string
+
+Requires: pip install asyncssh
+"""
+
+import asyncio
+import time
+from ssh_session import (DRAIN_QUIET, GENERIC_PROMPT_RE, PAGER_MARKERS, SETUP_COMMANDS, prompt_regex, last_line,
+                         detect_platform)
+from pipeline import NOT_STARTED, CANCELLED
+
+try:
+    import asyncssh
+    HAVE_ASYNCSSH = True
+except Exception:
+    HAVE_ASYNCSSH = False
+
+
+async def async_read_until_prompt(process, prompt=None, idle_timeout=10, max_time=None, stats=None, matcher=None):
+    """asyncio version of ssh_session.read_until_prompt(); same return value and stats.
+
+    `matcher`, a compiled regex, replaces the pattern built from `prompt`.
+    """
+    if matcher is None:
+        matcher = prompt_regex(prompt) if prompt else GENERIC_PROMPT_RE
+    loop = asyncio.get_running_loop()
+    output = ''
+    nbytes = 0
+    found = False
+    idle = False
+    start = loop.time()
+    last_progress = start
+    max_gap = 0.0
+    while True:
+        now = loop.time()
+        wait = last_progress + idle_timeout - now
+        if max_time is not None:
+            wait = min(wait, start + max_time - now)
+        if wait <= 0:
+            idle = now - last_progress >= idle_timeout
+            max_gap = max(max_gap, now - last_progress)
+            break
+        try:
+            text = await asyncio.wait_for(process.stdout.read(65535), wait)
+        except asyncio.TimeoutError:
+            continue
+        if not text:
+            # Channel closed by the device
+            found = bool(matcher.search(last_line(output)))
+            break
+        now = loop.time()
+        max_gap = max(max_gap, now - last_progress)
+        last_progress = now
+        nbytes += len(text.encode('utf-8'))
+        output += text
+        if any(m in text for m in PAGER_MARKERS):
+            process.stdin.write(' ')
+            continue
+        if matcher.search(last_line(output)):
+            found = True
+            break
+    if stats is not None:
+        stats.update({'bytes': nbytes, 'elapsed': loop.time() - start,
+                      'prompt_found': found, 'idle': idle, 'max_gap': max_gap})
+    return output, found
+
+
+class AsyncSSHSession:
+    """asyncio counterpart of ssh_session.SSHSession (one login, many commands).
+
+    `setup_commands` replaces the platform defaults (paging off on Cisco, 'cli'
+    on Juniper) for devices such as WLCs or console servers that need their own.
+    `prompt_re` (a compiled regex) is matched against the last line instead of
+    the prompt learned at login, for devices whose prompt changes with the
+    current directory (e.g. Avocent's '--:- / cli->').
+    A command that ends without its prompt is followed by a resync, as in
+    SSHSession; if that fails too, run() raises instead of reading the late
+    output as the next command's.
+    """
+
+    def __init__(self, host_ip, user, password, connect_timeout=10, idle_timeout=10, setup_commands=None,
+                 prompt_re=None):
+        self.host_ip = host_ip
+        self.user = user
+        self.password = password
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.setup_commands = setup_commands
+        self.prompt_re = prompt_re
+        self.conn = None
+        self.process = None
+        self.banner = ''
+        self.prompt = None
+        self.platform = 'unknown'
+        self.in_sync = True
+
+    async def open(self):
+        self.conn = await asyncio.wait_for(
+            asyncssh.connect(self.host_ip, username=self.user, password=self.password,
+                             known_hosts=None, client_keys=None, agent_path=None),
+            self.connect_timeout
+        )
+        self.process = await self.conn.create_process(term_type='vt100', term_size=(511, 24))
+        self.banner, found = await async_read_until_prompt(self.process, None, idle_timeout=10, max_time=10)
+        self.prompt = last_line(self.banner).strip() if found else None
+        self.platform = detect_platform(self.banner)
+        setup_commands = self.setup_commands
+        if setup_commands is None:
+            setup_commands = SETUP_COMMANDS.get(self.platform, [])
+        for command in setup_commands:
+            self.process.stdin.write(command + '\n')
+            output, found = await async_read_until_prompt(self.process, None, idle_timeout=self.idle_timeout)
+            # 'cli' on JunOS replaces the shell prompt with the CLI one
+            self.prompt = last_line(output).strip() if found else None
+        return self
+
+    async def drain(self, quiet=DRAIN_QUIET):
+        """Discard whatever the device is still sending, until it has been quiet for `quiet` seconds."""
+        while True:
+            try:
+                text = await asyncio.wait_for(self.process.stdout.read(65535), quiet)
+            except asyncio.TimeoutError:
+                return
+            if not text:
+                return
+
+    async def resync(self, idle_timeout=None):
+        """Get back to a clean prompt after a command that ended without one; see SSHSession.resync()."""
+        if idle_timeout is None:
+            idle_timeout = self.idle_timeout
+        self.process.stdin.write('\n')
+        _, found = await async_read_until_prompt(self.process, self.prompt, idle_timeout=idle_timeout,
+                                                 matcher=self.prompt_re)
+        if found:
+            await self.drain()
+        self.in_sync = found
+        return found
+
+    async def run(self, command, idle_timeout=None, max_time=None, stats=None):
+        if idle_timeout is None:
+            idle_timeout = self.idle_timeout
+        if not self.in_sync:
+            raise RuntimeError(f"session to {self.host_ip} is out of sync after an incomplete command")
+        if stats is not None:
+            stats['command'] = command
+        self.process.stdin.write(command + '\n')
+        output, found = await async_read_until_prompt(self.process, self.prompt, idle_timeout=idle_timeout,
+                                                      max_time=max_time, stats=stats, matcher=self.prompt_re)
+        if not found:
+            await self.resync(idle_timeout)
+        return output, found
+
+    async def run_many(self, commands, idle_timeout=None):
+        results = []
+        for command in commands:
+            stats = {}
+            output, _ = await self.run(command, idle_timeout=idle_timeout, stats=stats)
+            results.append((command, output, stats))
+        return results
+
+    async def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            try:
+                await self.conn.wait_closed()
+            except Exception:
+                pass
+        self.conn = None
+        self.process = None
+
+    async def __aenter__(self):
+        try:
+            return await self.open()
+        except BaseException:
+            await self.close()
+            raise
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+async def _collect_one(semaphore, host_ip, user, password, commands, host_timeout, session_kwargs,
+                       deadline=None, grace=0):
+    async with semaphore:
+        started = time.monotonic()
+        timeout = host_timeout
+        if deadline is not None:
+            if started >= deadline:
+                return False, NOT_STARTED
+            timeout = min(host_timeout, deadline + grace - started)
+        try:
+            async def work():
+                async with AsyncSSHSession(host_ip, user, password, **session_kwargs) as session:
+                    results = await session.run_many(commands)
+                    return {'platform': session.platform, 'results': results}
+            result = await asyncio.wait_for(work(), timeout)
+            result['elapsed'] = time.monotonic() - started
+            return True, result
+        except asyncio.TimeoutError:
+            if timeout < host_timeout:
+                return False, CANCELLED
+            return False, f"host timeout after {host_timeout}s"
+        except Exception as e:
+            return False, str(e) or e.__class__.__name__
+
+
+async def collect_fleet(hosts, user, password, commands, concurrency=200, host_timeout=300,
+                        connect_timeout=10, idle_timeout=10, setup_commands=None, prompt_re=None,
+                        deadline=None, grace=0):
+    """Run `commands` on every host in `hosts` (list of IPs) concurrently.
+
+    At most `concurrency` hosts are in flight; each host is cancelled after
+    `host_timeout` seconds. Returns a list of (ok, result_or_error) in the
+    same order as `hosts`. `deadline` is a time.monotonic() value, as for
+    pipeline.run_pipeline(). `setup_commands` and `prompt_re` go to every
+    AsyncSSHSession.
+    """
+    if not HAVE_ASYNCSSH:
+        raise RuntimeError('asyncssh is not installed (pip install asyncssh)')
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    session_kwargs = {'connect_timeout': connect_timeout, 'idle_timeout': idle_timeout,
+                      'setup_commands': setup_commands, 'prompt_re': prompt_re}
+    tasks = [_collect_one(semaphore, host_ip, user, password, commands, host_timeout, session_kwargs,
+                          deadline=deadline, grace=grace)
+             for host_ip in hosts]
+    return await asyncio.gather(*tasks)
+
+
+def run_fleet(hosts, user, password, commands, **kwargs):
+    """Blocking wrapper around collect_fleet() for the synchronous scripts."""
+    return asyncio.run(collect_fleet(hosts, user, password, commands, **kwargs))
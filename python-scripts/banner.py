@@ -2,7 +2,7 @@
 """
 banner.py
 
-Usage: python3 banner.py [--banner banner.txt] [--dry-run] [--debug]
+Usage: python3 banner.py [--banner banner.txt] [--dry-run] [--debug] [--resume RUN_ID]
 
 Reads credentials from credentials.txt.enc (uses secret.key), reads hosts.txt (hostname ip),
 reads a banner file (default: banner.txt in the same folder), and updates Juniper devices by
@@ -13,6 +13,10 @@ loading configuration via 'load merge terminal' with a 'system {
 }' block. Commits the change.
 
 This script connects via paramiko invoke_shell and sends the commands interactively.
+
+Every host's result goes to a run journal (journal.py). If a run is cut short,
+--resume <run id> (printed at the start of the run) only pushes to the hosts
+that have not committed yet. Dry runs are not journaled.
 """
 
 import argparse
@@ -21,6 +25,7 @@ import time
 from pathlib import Path
 from cryptography.fernet import Fernet
 import paramiko
+from journal import RunJournal
 
 
 def load_credentials(base_path: Path):
@@ -143,6 +148,7 @@ def main():
     parser.add_argument('--banner', help='Banner file to use', default='banner.txt')
     parser.add_argument('--dry-run', action='store_true')
     parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--resume', metavar='RUN_ID', help='Finish an interrupted run: skip hosts that already committed')
     args = parser.parse_args()
 
     base = Path(__file__).parent
@@ -163,11 +169,33 @@ def main():
     banner_text = banner_file.read_text()
     config_block = build_junos_config_block(banner_text)
 
+    journal = None
+    if not args.dry_run:
+        try:
+            journal = RunJournal('banner', resume=args.resume, banner=args.banner)
+        except FileNotFoundError as e:
+            print(f"Cannot resume: {e}")
+            sys.exit(2)
+        if journal.info.get('banner', args.banner) != args.banner:
+            print(f"Warning: run {journal.run_id} pushed {journal.info['banner']}, now pushing {args.banner}")
+        if args.resume:
+            print(f"Resuming run {journal.run_id}: {len(journal.succeeded())} hosts already done")
+        else:
+            print(f"Run id {journal.run_id} (finish an interrupted run with --resume {journal.run_id})")
+
     successes = 0
     for ip, name in hosts:
+        if journal and journal.done(name):
+            print(f"{name}: already committed in run {journal.run_id}, skipping")
+            successes += 1
+            continue
         ok = run_on_host(ip, name, user, pwd, config_block, dry_run=args.dry_run, debug=args.debug)
+        if journal:
+            journal.record(name, ip, ok)
         if ok:
             successes += 1
+    if journal:
+        journal.close(complete=True)
 
     print(f"Completed: {successes}/{len(hosts)} updated successfully")
 
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+bench_parsers.py
+
+Micro-benchmark for the table parsers in parsers.py: rows/sec of the
+line-by-line loops (before) against the whole-buffer regex parsers (after),
+on captured outputs, and a check that both return the same rows.
+
+    python3 bench_parsers.py                    # outputs/*.txt
+    python3 bench_parsers.py /tmp/*_raw.txt     # raw files written by sh_int_and_sh_mac.py --debug
+
+A file counts as a MAC table if it has MAC_RE lines and as an interface
+table if it has the 'Interface ... Status' header; other files are skipped.
+When no captured file holds either table (outputs/ usually only has
+'sh run | sec dhcp' sections), the tables are rebuilt from the newest
+interfaces_and_mac_*.csv so the benchmark still runs on real interface
+names, descriptions and MACs.
+"""
+
+import argparse
+import csv
+import glob
+import time
+from pathlib import Path
+from parsers import INT_RE, MAC_RE, LineParser, GenericInterfaceParser, MacTableParser, run_stream
+
+HERE = Path(__file__).parent
+
+
+class GenericInterfaceLineParser(LineParser):
+    """Line-by-line INT_RE loop; the reference GenericInterfaceParser is checked against."""
+
+    def line(self, line):
+        l = line.strip()
+        lowl = l.lower()
+        # Skip headers, empty lines, paging prompts, errors and the command echo
+        if not l or lowl.startswith('interface') or '--more--' in lowl or lowl.startswith('%') or lowl.startswith('show '):
+            return
+        match = INT_RE.match(l)
+        if match:
+            data = match.groupdict()
+            self.rows.append({"interface": data['interface'], "admin_status": data['admin_status'],
+                              "oper_status": data['oper_status'], "description": data['description'] or ''})
+
+
+class MacTableLineParser(LineParser):
+    """Line-by-line MAC_RE loop; the reference MacTableParser is checked against."""
+
+    def line(self, line):
+        line = line.strip()
+        if not line or line.lower().startswith("vlan") or "--more--" in line.lower():
+            return
+        match = MAC_RE.match(line)
+        if match:
+            self.rows.append(match.groupdict())
+
+
+def load_captured(paths):
+    """Split captured files into (interface tables, MAC tables)."""
+    int_texts, mac_texts = [], []
+    for path in paths:
+        text = Path(path).read_text(errors='ignore')
+        macs = sum(1 for line in text.splitlines() if MAC_RE.match(line.strip()))
+        if macs:
+            mac_texts.append(text)
+        elif any(line.lstrip().lower().startswith('interface') and 'status' in line.lower()
+                 for line in text.splitlines()):
+            int_texts.append(text)
+    return int_texts, mac_texts
+
+
+def tables_from_csv(path):
+    """Rebuild per-host 'show interfaces description' / 'show mac address-table' text from a collector CSV."""
+    hosts = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            hosts.setdefault(row['host'], []).append(row)
+    int_texts, mac_texts = [], []
+    for host, rows in hosts.items():
+        int_lines = [f"{host}#show interfaces description",
+                     f"{'Interface':<31}{'Status':<15}{'Protocol':<9}Description"]
+        mac_lines = [f"{host}#show mac address-table", "          Mac Address Table",
+                     "-------------------------------------------", "",
+                     "Vlan    Mac Address       Type        Ports", "----    -----------       --------    -----"]
+        seen = set()
+        for row in rows:
+            if row['interface'] not in seen:
+                seen.add(row['interface'])
+                int_lines.append(f"{row['interface']:<31}{row['admin_status'] or 'up':<15}"
+                                 f"{row['oper_status'] or 'up':<9}{row['description']}")
+            mac_lines.append(f" {row['vlan']:<7}{row['mac address']:<18}DYNAMIC     {row['interface']}")
+        int_texts.append('\r\n'.join(int_lines + [f"{host}#"]))
+        mac_texts.append('\r\n'.join(mac_lines + [f"Total Mac Addresses for this criterion: {len(rows)}", f"{host}#"]))
+    return int_texts, mac_texts
+
+
+def bench(name, texts, before, after, repeat):
+    """Print rows/sec for both parser classes over `texts`; returns False if their rows differ."""
+    results = {}
+    for label, cls in (('before', before), ('after', after)):
+        rows = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for text in texts:
+                rows += len(run_stream(cls(), text))
+        elapsed = time.perf_counter() - start
+        results[label] = (rows, elapsed)
+        print(f"  {name:<10} {label:<7} {cls.__name__:<27} {rows:>9} rows  {elapsed:8.3f}s  "
+              f"{rows / elapsed if elapsed else 0:>12,.0f} rows/sec")
+    speedup = results['before'][1] / results['after'][1] if results['after'][1] else 0
+    print(f"  {name:<10} speed-up x{speedup:.1f}")
+    same = all(run_stream(before(), text) == run_stream(after(), text) for text in texts)
+    if not same:
+        print(f"  {name:<10} WARNING: before and after return different rows")
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the line-by-line and whole-buffer table parsers')
+    parser.add_argument('files', nargs='*', help='Captured outputs (default: outputs/*.txt)')
+    parser.add_argument('--csv', help='Collector CSV to rebuild tables from (default: newest interfaces_and_mac_*.csv)')
+    parser.add_argument('--repeat', type=int, default=20, help='Passes over the inputs (default: 20)')
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(str(HERE / 'outputs' / '*.txt')))
+    int_texts, mac_texts = load_captured(files)
+    print(f"{len(files)} captured files: {len(int_texts)} interface tables, {len(mac_texts)} MAC tables")
+    if not int_texts and not mac_texts:
+        snapshots = [path for path in glob.glob(str(HERE / 'interfaces_and_mac_*.csv'))
+                     if not path.endswith(('_preflight.csv', '_skipped.csv'))]
+        csv_path = args.csv or max(snapshots, default=None, key=lambda p: Path(p).stat().st_mtime)
+        if csv_path is None:
+            print("Nothing to benchmark: no captured tables and no interfaces_and_mac_*.csv")
+            return
+        int_texts, mac_texts = tables_from_csv(csv_path)
+        print(f"Rebuilt {len(int_texts)} hosts' tables from {Path(csv_path).name}")
+
+    ok = True
+    if int_texts:
+        ok &= bench('interfaces', int_texts, GenericInterfaceLineParser, GenericInterfaceParser, args.repeat)
+    if mac_texts:
+        ok &= bench('mac', mac_texts, MacTableLineParser, MacTableParser, args.repeat)
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
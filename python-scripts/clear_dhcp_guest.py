@@ -3,7 +3,7 @@ import paramiko
 import sys
 from pathlib import Path
 from cryptography.fernet import Fernet
-import time
+from ssh_session import learn_prompt, send_command, last_line
 
 # ==== Load and decrypt credentials from credentials.txt.enc ====
 enc_path = Path(__file__).parent / "credentials.txt.enc"
@@ -64,24 +64,10 @@ for host in hosts:
         )
         shell = client.invoke_shell()
         shell.settimeout(2)
-        time.sleep(1)
-        shell.recv(65535)
-        shell.send('cli\n')
-        time.sleep(1)
-        shell.recv(65535)
-        shell.send('clear ip dhcp binding vrf GUEST *\n')
-        time.sleep(2)
-        output = ''
-        max_loops = 10
-        for _ in range(max_loops):
-            time.sleep(0.5)
-            try:
-                chunk = shell.recv(65535).decode('utf-8')
-            except Exception:
-                break
-            output += chunk
-            if '>' in chunk or '#' in chunk:
-                break
+        learn_prompt(shell)
+        cli_output, found = send_command(shell, 'cli', None)
+        prompt = last_line(cli_output).strip() if found else None
+        output, _ = send_command(shell, 'clear ip dhcp binding vrf GUEST *', prompt, idle_timeout=15)
         print(f"Output from {host}:\n{output}")
     except Exception as e:
         print(f"Failed to connect to {host}: {e}")
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+host_health.py
+
+Per-host health record kept on disk (host_health.json next to the scripts),
+so a switch that has failed run after run stops costing a full login timeout
+every cron cycle. An entry is keyed by host name and records:
+
+    ip                    the address it was last tried on
+    consecutive_failures  failed runs in a row (0 after a success)
+    unreachable           True when the last failure was tcp/22 not answering
+    last_error            error of the last failure
+    last_success          timestamp of the last complete collection
+    last_failure          timestamp of the last failure
+    avg_duration          seconds a successful collection takes (moving average)
+    last_duration         seconds the last successful collection took
+    latency               recent connect times and, per command, elapsed times,
+                          longest waits for output ('max_gap') and output size
+
+After FAILURE_THRESHOLD failures in a row the circuit is open: the host only
+gets the cheap TCP/22 probe (preflight.py) and is skipped. A host that was
+unreachable is tried again as soon as the probe answers; one that failed
+during the session is retried once its backoff has passed (one hour, doubling
+per further failure up to a day). Any success closes the circuit.
+
+The latency samples give each host its own timeouts (timeouts()): three times
+the p95 connect time and three times the p95 longest wait for output, kept
+between a floor and a ceiling, so a fast access switch fails fast while a
+big core is not cut off. Hosts listed in timeout_overrides.json use the
+values given there instead:
+
+    {"SWTC19AC01": {"connect_timeout": 20, "idle_timeout": 90}}
+
+    health = HostHealth()
+    if health.allow(name, reachable=probe['reachable']):
+        ...
+        health.record_success(name, ip, duration)   # or record_failure(name, ip, error)
+    health.save()
+"""
+
+import json
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+DEFAULT_HEALTH = Path(__file__).parent / 'host_health.json'
+FAILURE_THRESHOLD = 3
+BACKOFF_BASE = 3600
+BACKOFF_MAX = 86400
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DEFAULT_OVERRIDES = Path(__file__).parent / 'timeout_overrides.json'
+SAMPLES = 20         # latency samples kept per host and command
+MIN_SAMPLES = 3      # fewer than this and the caller's defaults are used
+CONNECT_FLOOR, CONNECT_CEILING = 3, 30
+IDLE_FLOOR, IDLE_CEILING = 3, 120
+
+
+def p95(samples):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+class HostHealth:
+    """Thread-safe view of host_health.json; call save() once the run is done."""
+
+    def __init__(self, path=DEFAULT_HEALTH, threshold=FAILURE_THRESHOLD, overrides_path=DEFAULT_OVERRIDES):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.overrides = {}
+        self.dirty = False
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text())
+            except Exception as e:
+                print(f"Warning: ignoring unreadable {self.path}: {e}")
+        overrides_path = Path(overrides_path)
+        if overrides_path.exists():
+            try:
+                self.overrides = json.loads(overrides_path.read_text())
+            except Exception as e:
+                print(f"Warning: ignoring unreadable {overrides_path}: {e}")
+
+    def get(self, name):
+        with self.lock:
+            return dict(self.entries.get(name, {}))
+
+    def is_open(self, name):
+        """True when `name` has failed `threshold` runs in a row."""
+        return self.get(name).get('consecutive_failures', 0) >= self.threshold
+
+    def expected_duration(self, name):
+        """Seconds a collection of `name` is expected to take, or None without history."""
+        return self.get(name).get('avg_duration')
+
+    def retry_at(self, name):
+        """When an open circuit allows the next session attempt (None if the circuit is closed)."""
+        entry = self.get(name)
+        failures = entry.get('consecutive_failures', 0)
+        if failures < self.threshold or not entry.get('last_failure'):
+            return None
+        backoff = min(BACKOFF_BASE * 2 ** (failures - self.threshold), BACKOFF_MAX)
+        return datetime.strptime(entry['last_failure'], TIME_FORMAT) + timedelta(seconds=backoff)
+
+    def allow(self, name, reachable=True):
+        """Whether to open a session to `name` this run; `reachable` is its TCP/22 probe result."""
+        if not self.is_open(name):
+            return True
+        if not reachable:
+            return False
+        if self.get(name).get('unreachable'):
+            return True  # it answers again
+        return datetime.now() >= self.retry_at(name)
+
+    def record_success(self, name, ip, duration):
+        with self.lock:
+            entry = self.entries.setdefault(name, {})
+            avg = entry.get('avg_duration')
+            entry.update({'ip': ip, 'consecutive_failures': 0, 'unreachable': False,
+                          'last_success': datetime.now().strftime(TIME_FORMAT),
+                          'avg_duration': round(duration if avg is None else 0.7 * avg + 0.3 * duration, 1),
+                          'last_duration': round(duration, 1)})
+            self.dirty = True
+
+    def timeouts(self, name, connect_timeout=10, idle_timeout=10):
+        """(connect_timeout, idle_timeout, source) for `name`; source is 'override', 'learned' or 'default'.
+
+        The arguments are used for whatever the override file and the history
+        do not cover.
+        """
+        override = self.overrides.get(name)
+        if override:
+            return (override.get('connect_timeout', connect_timeout),
+                    override.get('idle_timeout', idle_timeout), 'override')
+        latency = self.get(name).get('latency', {})
+        connects = latency.get('connect', [])
+        gaps = [gap for command in latency.get('commands', {}).values() for gap in command.get('max_gap', [])]
+        source = 'default'
+        if len(connects) >= MIN_SAMPLES:
+            connect_timeout = min(max(3 * p95(connects), CONNECT_FLOOR), CONNECT_CEILING)
+            source = 'learned'
+        if len(gaps) >= MIN_SAMPLES:
+            idle_timeout = min(max(3 * p95(gaps), IDLE_FLOOR), IDLE_CEILING)
+            source = 'learned'
+        return round(connect_timeout, 1), round(idle_timeout, 1), source
+
+    def record_latency(self, name, connect_time, results):
+        """Add one session's samples: its connect time (None if unknown) and [(command, output, stats)]."""
+        with self.lock:
+            latency = self.entries.setdefault(name, {}).setdefault('latency', {})
+            if connect_time is not None:
+                latency['connect'] = (latency.get('connect', []) + [round(connect_time, 2)])[-SAMPLES:]
+            commands = latency.setdefault('commands', {})
+            for command, _, stats in results:
+                if 'max_gap' not in stats:
+                    continue  # NETCONF replies are not read from a shell
+                entry = commands.setdefault(command, {})
+                for key in ('elapsed', 'max_gap'):
+                    entry[key] = (entry.get(key, []) + [round(stats[key], 2)])[-SAMPLES:]
+                entry['bytes'] = stats.get('bytes', 0)
+            self.dirty = True
+
+    def record_failure(self, name, ip, error, unreachable=False):
+        with self.lock:
+            entry = self.entries.setdefault(name, {})
+            entry.update({'ip': ip, 'consecutive_failures': entry.get('consecutive_failures', 0) + 1,
+                          'unreachable': unreachable, 'last_error': str(error),
+                          'last_failure': datetime.now().strftime(TIME_FORMAT)})
+            self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.entries, indent=2, sort_keys=True))
+            os.replace(tmp, self.path)
+            self.dirty = False
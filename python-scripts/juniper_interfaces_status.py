@@ -1,12 +1,26 @@
 #!/usr/bin/python3
 # ...existing code...
-import re
 import csv
 import paramiko
 import sys
+import argparse
 from pathlib import Path
 from cryptography.fernet import Fernet
 from datetime import datetime
+from ssh_session import learn_prompt, send_command, last_line
+from junos_xml import JUNOS_INT_COMMAND
+from parsers import parse, INT_COMMAND
+from preflight import sweep, PROBE_TIMEOUT
+
+# CLI args
+parser = argparse.ArgumentParser(add_help=False)
+parser.add_argument('--xml', action='store_true',
+                    help="Read '| display xml' and parse it structurally instead of scraping the text table")
+parser.add_argument('--no-preflight', action='store_true',
+                    help='Skip the TCP/22 reachability sweep and try SSH on every host')
+parser.add_argument('--probe-timeout', type=float, default=PROBE_TIMEOUT,
+                    help=f'Seconds to wait for TCP/22 in the pre-flight sweep (default: {PROBE_TIMEOUT})')
+args, _ = parser.parse_known_args()
 # ==== Load and decrypt credentials from credentials.txt.enc ====
 enc_path = Path(__file__).parent / "credentials.txt.enc"
 key_path = Path(__file__).parent / "secret.key"
@@ -53,17 +67,17 @@ if not hosts_path.is_file():
 with open(hosts_path) as f:
     hosts = [line.strip() for line in f if line.strip()]
 
-# ==== Regex pattern (robust) ====
-pattern = re.compile(
-    r"^(?P<interface>\S+)\s+"
-    r"(?P<admin_status>\S+)\s+"
-    r"(?P<oper_status>\S+)"
-    r"(?:\s+(?P<description>.*))?$"
-)
-
 # ==== Collect all parsed data ====
 all_data = []
 
+# ==== Pre-flight: probe TCP/22 on every switch at once; those that do not answer skip SSH ====
+if not args.no_preflight:
+    probes = sweep(hosts, timeout=args.probe_timeout)
+    for host in hosts:
+        if not probes[host]['reachable']:
+            print(f"Failed to connect to {host}: tcp/22 unreachable ({probes[host]['error']})")
+    hosts = [host for host in hosts if probes[host]['reachable']]
+
 # ==== Loop over switches ====
 for host in hosts:
     print(f"\nConnecting to {host}...")
@@ -80,49 +94,21 @@ for host in hosts:
         )
         shell = client.invoke_shell()
         shell.settimeout(2)
-        import time
         # Wait for initial prompt/banner
-        time.sleep(1)
-        shell.recv(65535)
-        shell.send('cli\n')
-        time.sleep(1)
-        shell.recv(65535)  # Clear any output from cli command
-        shell.send('show interfaces description\n')
-        time.sleep(1)
-        output = ''
-        prompt_found = False
-        max_loops = 20
-        prompt_patterns = ['>', '#']  # Juniper prompt usually ends with '>' or '#'
-        for _ in range(max_loops):
-            time.sleep(0.5)
-            try:
-                chunk = shell.recv(65535).decode('utf-8')
-            except Exception:
-                break
-            output += chunk
-            # Handle paging (e.g., '--More--')
-            if '--More--' in chunk:
-                shell.send(' ')
-            # Check for prompt at end of output
-            if any(chunk.strip().endswith(p) for p in prompt_patterns):
-                prompt_found = True
-                break
+        learn_prompt(shell)
+        # Enter the CLI; its prompt (user@host>) replaces the shell one
+        cli_output, found = send_command(shell, 'cli', None)
+        prompt = last_line(cli_output).strip() if found else None
+        # '| no-more' turns the pager off for the XML form; for text, paging
+        # ('--More--' / '---(more)---') is answered inside send_command
+        command = JUNOS_INT_COMMAND if args.xml else INT_COMMAND
+        output, prompt_found = send_command(shell, command, prompt)
         if not prompt_found:
             print(f"Warning: Prompt not detected for {host}. Output may be incomplete.")
 
-        # Parse output
-        for line in output.splitlines():
-            line = line.strip()
-            # Skip headers, empty lines, and paging prompts
-            if not line or line.lower().startswith("interface") or "--more--" in line.lower():
-                continue
-            match = pattern.match(line)
-            if match:
-                data = match.groupdict()
-                if data["description"] is None:
-                    data["description"] = ""
-                data["host"] = host
-                all_data.append(data)
+        # Parse output with the shared Juniper parser for this command
+        for row in parse('juniper', command, output):
+            all_data.append({"host": host, **row})
     except Exception as e:
         print(f"Failed to connect to {host}: {e}")
     finally:
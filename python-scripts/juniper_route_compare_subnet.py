@@ -1,6 +1,7 @@
 import paramiko
 import csv
 from cryptography.fernet import Fernet
+from preflight import probe
 import ipaddress
 
 # Router details
@@ -36,6 +37,11 @@ def decrypt_credentials_file(enc_file_path, key_file_path):
 
 def get_routes():
     username, password = decrypt_credentials_file(CREDS_FILE, KEY_FILE)
+    # Pre-flight: fail in seconds rather than waiting out the SSH connect on a dead router
+    reachable = probe(ROUTER_IP)
+    if not reachable['reachable']:
+        print(f"Error: {ROUTER_IP} does not answer on tcp/22 ({reachable['error']})")
+        return []
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     try:
@@ -2,6 +2,9 @@
 import paramiko
 import csv
 from cryptography.fernet import Fernet
+from preflight import probe
+from junos_xml import JUNOS_ROUTE_COMMAND
+from parsers import parse
 
 # Router details
 ROUTER_IP = "172.25.123.1"      # Replace with your router IP
@@ -35,6 +38,11 @@ def decrypt_credentials_file(enc_file_path, key_file_path):
 def get_routes():
     # Decrypt credentials
     username, password = decrypt_credentials_file(CREDS_FILE, KEY_FILE)
+    # Pre-flight: fail in seconds rather than waiting out the SSH connect on a dead router
+    reachable = probe(ROUTER_IP)
+    if not reachable['reachable']:
+        print(f"Error: {ROUTER_IP} does not answer on tcp/22 ({reachable['error']})")
+        return []
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
@@ -42,7 +50,14 @@ def get_routes():
         # Connect to the router
         ssh.connect(ROUTER_IP, username=username, password=password)
 
-        # Execute the command
+        # Execute the command; the XML form carries each prefix in <rt-destination>
+        stdin, stdout, stderr = ssh.exec_command(JUNOS_ROUTE_COMMAND)
+        output = stdout.read().decode()
+        routes = [row["destination"] for row in parse('juniper', JUNOS_ROUTE_COMMAND, output)]
+        if routes:
+            return routes
+
+        # No XML reply: fall back to the text table
         stdin, stdout, stderr = ssh.exec_command("show route all")
         output = stdout.read().decode()
 
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+junos_xml.py
+
+Structured collection from Juniper devices. Instead of scraping CLI text, ask
+JunOS for XML ('| display xml', or the same RPCs over NETCONF) and walk the
+reply with a streaming pull parser: each record is handed back as soon as its
+closing tag arrives and then dropped from the tree, so a stack with tens of
+thousands of MAC entries never builds a full document in memory. There is no
+paging to answer and no column positions to guess.
+
+    output, _ = session.run(JUNOS_MAC_COMMAND)
+    for vlan, mac, port in parse_mac_xml(output):
+        ...
+
+NETCONF (port 830) needs: pip install ncclient
+"""
+
+import time
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+try:
+    from ncclient import manager
+    from ncclient.xml_ import to_ele
+    HAVE_NCCLIENT = True
+except Exception:
+    HAVE_NCCLIENT = False
+
+JUNOS_INT_COMMAND = 'show interfaces descriptions | display xml | no-more'
+JUNOS_MAC_COMMAND = 'show ethernet-switching table | display xml | no-more'
+JUNOS_ROUTE_COMMAND = 'show route all | display xml | no-more'
+# The same data as NETCONF RPCs
+JUNOS_INT_RPC = '<get-interface-information><descriptions/></get-interface-information>'
+JUNOS_MAC_RPC = '<get-ethernet-switching-table-information/>'
+
+FEED_SIZE = 65536
+
+
+def local_name(tag):
+    """'{http://xml.juniper.net/...}name' -> 'name'."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def extract_reply(text):
+    """Return the <rpc-reply>...</rpc-reply> part of a CLI output ('' if there is none).
+
+    The command echo before it and the prompt after it are dropped.
+    """
+    start = text.find('<rpc-reply')
+    if start < 0:
+        return ''
+    end = text.rfind('</rpc-reply>')
+    if end < 0:
+        return text[start:]  # truncated; iter_records() keeps what parsed
+    return text[start:end + len('</rpc-reply>')]
+
+
+def iter_records(text, record_tags):
+    """Yield one {leaf name: text} dict per element named in `record_tags`.
+
+    Leaves are matched by local name (namespaces ignored); if a leaf name occurs
+    more than once inside a record the first one wins. Finished records are
+    removed from their parent so memory stays flat. A truncated reply stops
+    the iteration quietly after the last complete record.
+    """
+    xml = extract_reply(text)
+    if not xml:
+        return
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    stack = []
+    try:
+        for i in range(0, len(xml), FEED_SIZE):
+            parser.feed(xml[i:i + FEED_SIZE])
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    stack.append(elem)
+                    continue
+                stack.pop()
+                if local_name(elem.tag) not in record_tags:
+                    continue
+                record = {}
+                for child in elem.iter():
+                    if child is not elem and len(child) == 0:
+                        record.setdefault(local_name(child.tag), (child.text or '').strip())
+                yield record
+                if stack:
+                    stack[-1].remove(elem)
+        parser.close()
+    except ET.ParseError:
+        return
+
+
+def parse_interfaces_xml(text):
+    """'show interfaces descriptions | display xml' -> {interface: {admin_status, oper_status, description}}."""
+    interfaces = {}
+    for record in iter_records(text, ('physical-interface', 'logical-interface')):
+        name = record.get('name')
+        if not name:
+            continue
+        interfaces[name] = {"admin_status": record.get('admin-status', ''),
+                            "oper_status": record.get('oper-status', ''),
+                            "description": record.get('description', '')}
+    return interfaces
+
+
+def parse_mac_xml(text):
+    """'show ethernet-switching table | display xml' -> [(vlan, mac, port), ...].
+
+    Handles both the ELS (l2ng-*) and the older EX (mac-table-entry) layouts.
+    """
+    entries = []
+    for record in iter_records(text, ('l2ng-mac-entry', 'mac-table-entry')):
+        mac = record.get('l2ng-l2-mac-address') or record.get('mac-address')
+        if not mac:
+            continue
+        vlan = record.get('l2ng-l2-mac-vlan-name') or record.get('mac-vlan', '')
+        port = record.get('l2ng-l2-mac-logical-interface') or record.get('mac-interfaces', '')
+        entries.append((vlan, mac, port))
+    return entries
+
+
+def parse_routes_xml(text):
+    """'show route ... | display xml' -> list of destinations (e.g. '10.1.0.0/16')."""
+    return [record['rt-destination'] for record in iter_records(text, ('rt',))
+            if record.get('rt-destination')]
+
+
+def command_output(reply):
+    """Text of the <output> element in the reply to a <command format="text"> RPC ('' if there is none)."""
+    for record in iter_records(reply, ('rpc-reply',)):
+        return record.get('output', '')
+    return ''
+
+
+def netconf_run(host_ip, user, password, rpcs, commands=(), port=830, timeout=30):
+    """Send each RPC over one NETCONF session; returns [(rpc, reply_xml, stats)] like SSHSession.run_many().
+
+    `commands` are CLI commands run afterwards over the same session (as
+    <command format="text"> RPCs); their entries carry the plain text output.
+    """
+    if not HAVE_NCCLIENT:
+        raise RuntimeError('ncclient is not installed (pip install ncclient)')
+    results = []
+    with manager.connect(host=host_ip, port=port, username=user, password=password,
+                         hostkey_verify=False, allow_agent=False, look_for_keys=False,
+                         device_params={'name': 'junos'}, timeout=timeout) as conn:
+        requests = [(rpc, rpc) for rpc in rpcs]
+        requests += [(command, f'<command format="text">{escape(command)}</command>') for command in commands]
+        for name, rpc in requests:
+            start = time.monotonic()
+            reply = conn.dispatch(to_ele(rpc)).xml
+            output = reply if name == rpc else command_output(reply)
+            results.append((name, output, {'command': name, 'bytes': len(reply.encode('utf-8')),
+                                           'elapsed': time.monotonic() - start,
+                                           'prompt_found': True, 'idle': False}))
+    return results
@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+parsers.py
+
+One registry of output parsers for every collector, keyed by (platform,
+command). Regexes are compiled at import and TextFSM templates on first use,
+once per process, instead of once per host.
+
+    from parsers import parse
+    for row in parse('cisco', 'show interfaces description', output):
+        row['interface'], row['admin_status'], row['oper_status'], row['description']
+    for row in parse('cisco', 'show mac address-table', output):
+        row['vlan'], row['mac'], row['port']
+
+Every parser returns a list of dicts. Platforms are 'cisco', 'juniper' and
+'unknown'; a command with no parser for the platform falls back to the
+'unknown' entry, which is the generic line regex. To support a new platform,
+add a function and decorate it with @register(platform, command).
+
+Line-oriented parsers also work incrementally, fed straight from the channel
+so parsing overlaps the network wait and the raw table is never held whole:
+
+    parser = stream_parser('cisco', 'show mac address-table')
+    session.run('show mac address-table', sink=parser)
+    rows = parser.close()
+
+Very large outputs can be parsed in worker processes instead, off the GIL of
+the collector threads; the text reaches the worker through shared memory:
+
+    with ParserPool(processes=4) as pool:
+        rows = pool.parse('cisco', 'show mac address-table', output)
+"""
+
+import functools
+import io
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from junos_xml import (JUNOS_INT_COMMAND, JUNOS_MAC_COMMAND, JUNOS_ROUTE_COMMAND, JUNOS_INT_RPC, JUNOS_MAC_RPC,
+                       parse_interfaces_xml, parse_mac_xml, parse_routes_xml)
+
+try:
+    import textfsm
+    HAVE_TEXTFSM = True
+except Exception:
+    HAVE_TEXTFSM = False
+
+INT_COMMAND = 'show interfaces description'
+MAC_COMMAND = 'show mac address-table'
+
+# ==== Regex patterns ====
+INT_RE = re.compile(
+    r"^(?P<interface>\S+)\s+"
+    r"(?P<admin_status>\S+)\s+"
+    r"(?P<oper_status>\S+)"
+    r"(?:\s+(?P<description>.*))?$"
+)
+# Cisco IOS-XE 'show interfaces description' commonly has: Interface  Status  Protocol  Description
+CISCO_INT_RE = re.compile(
+    r"^(?P<interface>\S+)\s+"
+    r"(?P<admin_status>\S+)\s+"
+    r"(?P<oper_status>\S+)\s*"
+    r"(?P<description>.*)$"
+)
+MAC_RE = re.compile(
+    r"^(?P<vlan>\S+)\s+(?P<mac>[0-9a-fA-F:.\-]+)\s+\S+\s+(?P<port>\S+)"
+)
+
+# Whole-buffer versions of INT_RE and MAC_RE for findall(): one match per line, with the
+# lines the per-line loops skip (headers, command echo, % errors) excluded by the pattern
+# itself. [^\S\r\n] is a blank that does not end the line. The *_STRICT_RE variants also
+# drop '--More--' lines and take a lone \r as a line break, as splitlines() does; that
+# costs a scan of every line, so they only run on buffers where STRICT_NEEDED matches.
+BLANK = r"[^\S\r\n]"
+INT_ROW = (r"(\S+)" + BLANK + r"+(\S+)" + BLANK + r"+(\S+)"
+           r"(?:" + BLANK + r"+([^\r\n]*\S))?" + BLANK + r"*(?=[\r\n]|\Z)")
+MAC_ROW = r"(\S+)" + BLANK + r"+([0-9a-fA-F:.\-]+)" + BLANK + r"+\S+" + BLANK + r"+(\S+)"
+INT_SKIP = r"(?!(?i:interface|show )|%)"
+MAC_SKIP = r"(?!(?i:vlan))"
+STRICT_LINE = r"(?:\A|(?<=[\r\n]))" + BLANK + r"*"
+NO_PAGER = r"(?![^\r\n]*--(?i:more)--)"
+INT_TABLE_RE = re.compile(r"^" + BLANK + r"*" + INT_SKIP + INT_ROW, re.M)
+INT_TABLE_STRICT_RE = re.compile(STRICT_LINE + INT_SKIP + NO_PAGER + INT_ROW)
+MAC_TABLE_RE = re.compile(r"^" + BLANK + r"*" + MAC_SKIP + MAC_ROW, re.M)
+MAC_TABLE_STRICT_RE = re.compile(STRICT_LINE + MAC_SKIP + NO_PAGER + MAC_ROW)
+STRICT_NEEDED = re.compile(r"--(?i:more)--|\r(?!\n)")
+
+# ==== Interface names ====
+# Abbreviations as printed by IOS/IOS-XE; other prefixes expand when they match one full name.
+INTERFACE_ABBREVIATIONS = {
+    'fa': 'fastethernet',
+    'gi': 'gigabitethernet',
+    'tw': 'twogigabitethernet',
+    'fi': 'fivegigabitethernet',
+    'te': 'tengigabitethernet',
+    'twe': 'twentyfivegige',
+    'fo': 'fortygigabitethernet',
+    'hu': 'hundredgige',
+    'ap': 'appgigabitethernet',
+    'et': 'ethernet',
+    'eth': 'ethernet',
+    'po': 'port-channel',
+    'vl': 'vlan',
+    'lo': 'loopback',
+    'tu': 'tunnel',
+}
+INTERFACE_FULL_NAMES = sorted(set(INTERFACE_ABBREVIATIONS.values()))
+IFNAME_RE = re.compile(r"([A-Za-z][A-Za-z-]*?)\s*(\d.*)$")
+
+# ==== TextFSM templates ====
+TEMPLATES = {
+    ('cisco', INT_COMMAND): r"""
+Value INTERFACE (\S+)
+Value STATUS (.+?)
+Value PROTOCOL (.+?)
+Value DESCRIPTION (.*)
+
+Start
+  ^\s*Interface\s+Status\s+Protocol\s+Description -> Start
+  ^\s*${INTERFACE}\s+${STATUS}\s+${PROTOCOL}\s+${DESCRIPTION} -> Record
+""",
+}
+
+PARSERS = {}
+_compiled = {}
+_compile_lock = threading.Lock()
+
+
+def register(platform, command):
+    """Decorator: register fn(text) -> list of dicts for (platform, command)."""
+    def wrap(fn):
+        PARSERS[(platform, command)] = fn
+        return fn
+    return wrap
+
+
+def parse(platform, command, text):
+    """Parse `text`, the output of `command` on `platform`; returns a list of dicts."""
+    fn = PARSERS.get((platform, command)) or PARSERS.get(('unknown', command))
+    if fn is None:
+        raise KeyError(f"no parser for {command!r} on {platform!r}")
+    return fn(text)
+
+
+def parse_textfsm(platform, command, text):
+    """Run the (platform, command) TextFSM template; [] when textfsm is missing or fails.
+
+    The template is compiled once; TextFSM keeps state while parsing, so each
+    compiled template is used under its own lock.
+    """
+    if not HAVE_TEXTFSM or (platform, command) not in TEMPLATES:
+        return []
+    with _compile_lock:
+        if (platform, command) not in _compiled:
+            try:
+                fsm = textfsm.TextFSM(io.StringIO(TEMPLATES[(platform, command)]))
+            except Exception:
+                fsm = None
+            _compiled[(platform, command)] = (fsm, threading.Lock())
+    fsm, lock = _compiled[(platform, command)]
+    if fsm is None:
+        return []
+    try:
+        with lock:
+            fsm.Reset()
+            parsed = fsm.ParseText(text)
+            header = list(fsm.header)
+        return [dict(zip(header, row)) for row in parsed]
+    except Exception:
+        return []
+
+
+def _int_row(interface, admin, oper, desc):
+    return {"interface": interface, "admin_status": admin, "oper_status": oper, "description": desc}
+
+
+@functools.lru_cache(maxsize=8192)
+def canonical_interface(name):
+    """One spelling per interface, used as the join key between tables.
+
+    'Gi1/0/1', 'GigabitEthernet1/0/1' and 'gigabitethernet 1/0/1' all become
+    'gigabitethernet1/0/1'. Names without a known type prefix (Juniper
+    'ge-0/0/1.0', 'CPU') are only lower-cased.
+    """
+    name = name.strip()
+    m = IFNAME_RE.match(name)
+    if not m:
+        return name.lower()
+    prefix = m.group(1).lower()
+    full = INTERFACE_ABBREVIATIONS.get(prefix)
+    if full is None:
+        matches = [n for n in INTERFACE_FULL_NAMES if n.startswith(prefix)]
+        full = matches[0] if len(matches) == 1 and len(prefix) > 1 else prefix
+    return full + m.group(2).replace(' ', '')
+
+
+class InterfaceIndex:
+    """An interface table ({name: values}) looked up by canonical name.
+
+    Built once per host so MAC-table ports find their interface whichever way
+    either table spells it. A sub-interface or logical unit missing from the
+    table (Gi1/0/1.100, ge-0/0/1.0) resolves to its parent interface. Each
+    distinct port is resolved once; later rows are a single dict lookup.
+    """
+
+    def __init__(self, interfaces):
+        self.by_name = {canonical_interface(name): values for name, values in interfaces.items()}
+        self.resolved = {}
+
+    def get(self, port, default=None):
+        try:
+            values = self.resolved[port]
+        except KeyError:
+            key = canonical_interface(port)
+            values = self.by_name.get(key)
+            if values is None and '.' in key:
+                values = self.by_name.get(key.split('.', 1)[0])
+            self.resolved[port] = values
+        return default if values is None else values
+
+
+class LineParser:
+    """Incremental parser: feed() text chunks as they arrive, close() returns the rows.
+
+    Complete lines are parsed as soon as their line break arrives; only the
+    partial last line is kept between chunks. Subclasses implement line().
+    """
+
+    def __init__(self):
+        self.partial = ''
+        self.rows = []
+
+    def feed(self, text):
+        lines = (self.partial + text).splitlines(True)
+        self.partial = lines.pop() if lines and not lines[-1].endswith(('\n', '\r')) else ''
+        for line in lines:
+            self.line(line.rstrip('\r\n'))
+
+    def close(self):
+        if self.partial:
+            self.line(self.partial)
+            self.partial = ''
+        return self.finish()
+
+    def line(self, line):
+        raise NotImplementedError
+
+    def finish(self):
+        return self.rows
+
+
+class RegexParser(LineParser):
+    """LineParser that runs one multiline regex findall() over each run of complete lines.
+
+    Instead of splitting, stripping and matching line by line, every chunk up to
+    its last line break goes through `pattern` in one call (`strict_pattern`
+    when the chunk has paging prompts or lone carriage returns), which returns
+    a tuple of groups per row; make_rows() turns them into dicts.
+    """
+    pattern = None
+    strict_pattern = None
+
+    def feed(self, text):
+        text = self.partial + text
+        end = max(text.rfind('\n'), text.rfind('\r')) + 1
+        self.partial = text[end:]
+        if end:
+            self.rows.extend(self.make_rows(self.findall(text, end)))
+
+    def line(self, line):
+        self.rows.extend(self.make_rows(self.findall(line, len(line))))
+
+    def findall(self, text, end):
+        pattern = self.strict_pattern if STRICT_NEEDED.search(text, 0, end) else self.pattern
+        return pattern.findall(text, 0, end)
+
+    def make_rows(self, matches):
+        raise NotImplementedError
+
+
+class BufferedParser:
+    """Stream interface for parsers that need the whole output (XML, TextFSM)."""
+
+    def __init__(self, platform, command):
+        self.platform = platform
+        self.command = command
+        self.pieces = []
+
+    def feed(self, text):
+        self.pieces.append(text)
+
+    def close(self):
+        return parse(self.platform, self.command, ''.join(self.pieces))
+
+
+STREAM_PARSERS = {}
+
+
+def register_stream(platform, command):
+    """Decorator: register a LineParser class for (platform, command).
+
+    The class also serves parse() for that key unless a whole-text parser is
+    registered for it.
+    """
+    def wrap(cls):
+        STREAM_PARSERS[(platform, command)] = cls
+        PARSERS.setdefault((platform, command), lambda text: run_stream(cls(), text))
+        return cls
+    return wrap
+
+
+def run_stream(parser, text):
+    parser.feed(text)
+    return parser.close()
+
+
+def stream_parser(platform, command):
+    """A parser object with feed(text)/close() -> rows for (platform, command)."""
+    cls = STREAM_PARSERS.get((platform, command))
+    if cls is None and (platform, command) not in PARSERS:
+        cls = STREAM_PARSERS.get(('unknown', command))
+    if cls is None:
+        return BufferedParser(platform, command)
+    return cls()
+
+
+_layouts = {}
+
+
+def column_layout(header_line):
+    """Slices (interface, status, protocol, description) for a Cisco 'show interfaces description' header.
+
+    The header only changes with the software version, so each distinct header
+    line is measured once per process and its slices are reused for every host
+    that prints it. A header without 'Description' gets an 8-wide Protocol column.
+    """
+    layout = _layouts.get(header_line)
+    if layout is None:
+        low = header_line.lower()
+        iface_start = low.find('interface')
+        status_start = low.find('status')
+        proto_start = low.find('protocol')
+        desc_start = low.find('description')
+        if os.getenv('DEBUG_INT_PARSE'):
+            print(f"Header line: {repr(header_line)}")
+            print(f"Cols -> iface:{iface_start} status:{status_start} proto:{proto_start} desc:{desc_start}")
+        if desc_start == -1:
+            desc_start = proto_start + 8
+        layout = (slice(iface_start, status_start), slice(status_start, proto_start),
+                  slice(proto_start, desc_start), slice(desc_start, None))
+        _layouts[header_line] = layout
+    return layout
+
+
+@register_stream('cisco', INT_COMMAND)
+class CiscoInterfaceParser(LineParser):
+    """Column positions from the header line; the line regex if no header ever shows up."""
+
+    def __init__(self):
+        super().__init__()
+        self.interfaces = {}
+        self.cols = None
+        self.pre_header = []   # lines before the header, only parsed if no header is found
+
+    def line(self, l):
+        if self.cols is None:
+            low = l.lower()
+            if 'interface' in low and 'status' in low and 'protocol' in low:
+                self.cols = column_layout(l)
+                self.pre_header = []
+            else:
+                self.pre_header.append(l)
+            return
+        # A row has at least interface, status and protocol; the prompt left at the end ('SW1#') does not
+        if len(l.split()) < 3:
+            return
+        lowl = l.lower()
+        if '--more--' in lowl or lowl.startswith('%') or lowl.strip().startswith(INT_COMMAND):
+            return
+        iface_cols, status_cols, proto_cols, desc_cols = self.cols
+        iface = l[iface_cols].strip()
+        if iface:
+            self.interfaces[iface] = _int_row(iface, l[status_cols].strip(), l[proto_cols].strip(),
+                                              l[desc_cols].strip())
+
+    def finish(self):
+        if self.cols is None:
+            # no header found, fallback to regex/split per-line
+            for line in self.pre_header:
+                l = line.strip()
+                lowl = l.lower()
+                # Filter out blank lines, header echoes, paging and command echo or error lines
+                if not l or lowl.startswith('interface') or '--more--' in lowl or lowl.startswith('%') or lowl.startswith('show '):
+                    continue
+                cm = CISCO_INT_RE.match(l)
+                if cm:
+                    data = cm.groupdict()
+                    self.interfaces[data['interface']] = _int_row(data['interface'], data.get('admin_status', ''),
+                                                                  data.get('oper_status', ''),
+                                                                  (data.get('description') or '').strip())
+                    continue
+                parts = re.split(r"\s+", l, maxsplit=3)
+                if len(parts) >= 3:
+                    iface, admin, oper = parts[0].strip(), parts[1].strip(), parts[2].strip()
+                    desc = parts[3].strip() if len(parts) > 3 else ''
+                    self.interfaces[iface] = _int_row(iface, admin, oper, desc)
+            self.pre_header = []
+        return list(self.interfaces.values())
+
+
+@register('cisco', INT_COMMAND)
+def parse_cisco_interfaces(text):
+    """TextFSM when available, overlaid by the column-position parse."""
+    interfaces = {}
+    for vals in parse_textfsm('cisco', INT_COMMAND, text):
+        interfaces[vals.get('INTERFACE')] = _int_row(vals.get('INTERFACE'), vals.get('STATUS', ''),
+                                                     vals.get('PROTOCOL', ''),
+                                                     (vals.get('DESCRIPTION') or '').strip())
+    for row in run_stream(CiscoInterfaceParser(), text):
+        interfaces[row['interface']] = row
+    return list(interfaces.values())
+
+
+@register_stream('juniper', INT_COMMAND)
+@register_stream('unknown', INT_COMMAND)
+class GenericInterfaceParser(RegexParser):
+    """Interface table for Juniper and unrecognised devices (INT_RE, a whole buffer at a time)."""
+    pattern = INT_TABLE_RE
+    strict_pattern = INT_TABLE_STRICT_RE
+
+    def make_rows(self, matches):
+        return [_int_row(iface, admin, oper, desc) for iface, admin, oper, desc in matches]
+
+
+@register_stream('unknown', MAC_COMMAND)
+class MacTableParser(RegexParser):
+    """'show mac address-table' -> [{vlan, mac, port}] (MAC_RE, a whole buffer at a time)."""
+    pattern = MAC_TABLE_RE
+    strict_pattern = MAC_TABLE_STRICT_RE
+
+    def make_rows(self, matches):
+        return [{"vlan": vlan, "mac": mac, "port": port} for vlan, mac, port in matches]
+
+
+@register('juniper', JUNOS_INT_COMMAND)
+@register('juniper', JUNOS_INT_RPC)
+def parse_junos_interfaces_xml(text):
+    return [{"interface": iface, **vals} for iface, vals in parse_interfaces_xml(text).items()]
+
+
+@register('juniper', JUNOS_MAC_COMMAND)
+@register('juniper', JUNOS_MAC_RPC)
+def parse_junos_mac_xml(text):
+    return [{"vlan": vlan, "mac": mac, "port": port} for vlan, mac, port in parse_mac_xml(text)]
+
+
+@register('juniper', JUNOS_ROUTE_COMMAND)
+def parse_junos_routes_xml(text):
+    return [{"destination": destination} for destination in parse_routes_xml(text)]
+
+
+def _parse_shared(platform, command, name, size):
+    """ParserPool worker: decode `size` bytes of the shared memory block `name` and parse them."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        text = bytes(shm.buf[:size]).decode('utf-8', errors='ignore')
+    finally:
+        shm.close()
+    return parse(platform, command, text)
+
+
+class ParserPool:
+    """parse() backed by a process pool, for outputs too big to parse on a collector thread.
+
+    The output is copied once into a shared memory block that the worker reads
+    directly, instead of being pickled through the pool's pipe; only the rows
+    come back pickled. Outputs under `min_chars` characters are parsed in the
+    calling thread, where the round trip would cost more than it saves.
+    parse() blocks until its rows are back, so call it from as many threads
+    as there are processes to keep them all busy.
+
+    Workers are started from a fork server (spawned where there is none), not
+    forked from the collector: the pool starts them on first use, when the
+    collector and parser threads are already running, and a plain fork() would
+    copy any lock one of those threads held at that moment into the worker,
+    still locked.
+    """
+
+    def __init__(self, processes=None, min_chars=256 * 1024):
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(method))
+        self.min_chars = min_chars
+
+    def parse(self, platform, command, text):
+        if len(text) < self.min_chars:
+            return parse(platform, command, text)
+        data = text.encode('utf-8')
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        try:
+            shm.buf[:len(data)] = data
+            return self.executor.submit(_parse_shared, platform, command, shm.name, len(data)).result()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
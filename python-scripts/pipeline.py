@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+pipeline.py
+
+Staged collection: collector threads -> parser threads -> one writer, joined
+by bounded queues. Each host's rows reach the writer as soon as that host is
+parsed, so a long run keeps writing its output as it goes and a crash late in
+the run no longer loses the hosts already done. A slow writer holds up
+parsing and a slow parser holds up collection, so raw outputs never pile up
+in memory.
+
+    for host, ok, result in run_pipeline(hosts, fetch, parse, collectors=8):
+        if ok:
+            writer.writerows(result)       # runs in the calling thread only
+        else:
+            print(f"{host} failed: {result}")
+
+Results come back in completion order; with one collector that is the input order.
+Collectors take items in list order, so longest_first() can order them by
+expected duration beforehand, and in_order() puts the results back in the
+order of the original list for the writer:
+
+    position = {host: i for i, host in enumerate(hosts)}
+    for host, ok, result in in_order(run_pipeline(ordered, fetch, parse, collectors=8), position):
+        ...                                # hosts order, whatever order they finished in
+
+With a deadline no item is started once it has passed, and items still in
+flight `grace` seconds later are given up on; both come back with ok False
+and NOT_STARTED or CANCELLED as the result, so the run ends on time with
+whatever was collected.
+"""
+
+import heapq
+import queue
+import threading
+import time
+
+DONE = object()
+UNKNOWN_DURATION = 30
+NOT_STARTED = 'not started before the deadline'
+CANCELLED = 'cancelled at the deadline'
+
+
+def run_pipeline(items, collect, parse=None, collectors=1, parsers=1, maxsize=None, deadline=None, grace=0):
+    """Yield (item, ok, result) for every item once it has been collected and parsed.
+
+    collect(item) runs on `collectors` threads and parse(item, collected) on
+    `parsers` threads; the results are yielded in the calling thread, which
+    is therefore the single writer. When either stage raises, ok is False
+    and result is the error string. Each queue holds at most `maxsize`
+    entries (default: two per thread draining it). Closing the generator
+    early stops collectors from starting further items.
+    `deadline` is a time.monotonic() value: items not started by then are
+    yielded as (item, False, NOT_STARTED) and items still in flight at
+    deadline + `grace` as (item, False, CANCELLED). Their threads are left
+    to finish in the background (they are daemon threads).
+    """
+    collectors = max(1, collectors)
+    parsers = max(1, parsers)
+    items = list(items)
+    todo = queue.Queue()
+    for index in range(len(items)):
+        todo.put(index)
+    raw = queue.Queue(maxsize or 2 * parsers)
+    parsed = queue.Queue(maxsize or 2)
+    stop = threading.Event()
+    lock = threading.Lock()
+    started = set()   # indexes taken by a collector
+    finished = set()  # indexes yielded to the caller
+
+    def put(q, entry):
+        while not stop.is_set():
+            try:
+                q.put(entry, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def collect_worker():
+        while not stop.is_set():
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            with lock:
+                if stop.is_set():
+                    return
+                try:
+                    index = todo.get_nowait()
+                except queue.Empty:
+                    return
+                started.add(index)
+            try:
+                entry = (index, True, collect(items[index]))
+            except Exception as e:
+                entry = (index, False, str(e) or e.__class__.__name__)
+            put(raw, entry)
+
+    def parse_worker():
+        while True:
+            entry = raw.get()
+            if entry is DONE:
+                return
+            index, ok, result = entry
+            if ok and parse is not None:
+                try:
+                    result = parse(items[index], result)
+                except Exception as e:
+                    ok, result = False, str(e) or e.__class__.__name__
+            put(parsed, (index, ok, result))
+
+    def start(target, count):
+        threads = [threading.Thread(target=target, daemon=True) for _ in range(count)]
+        for t in threads:
+            t.start()
+        return threads
+
+    def finish():
+        # Each stage ends once the one before it has drained
+        for t in collect_threads:
+            t.join()
+        for _ in parse_threads:
+            put(raw, DONE)
+        for t in parse_threads:
+            t.join()
+        put(parsed, DONE)
+
+    collect_threads = start(collect_worker, collectors)
+    parse_threads = start(parse_worker, parsers)
+    threading.Thread(target=finish, daemon=True).start()
+    try:
+        while True:
+            if deadline is None:
+                entry = parsed.get()
+            else:
+                try:
+                    entry = parsed.get(timeout=max(0, deadline + grace - time.monotonic()))
+                except queue.Empty:
+                    break
+            if entry is DONE:
+                break
+            index, ok, result = entry
+            finished.add(index)
+            yield items[index], ok, result
+        # Empty unless the deadline cut the run short
+        with lock:
+            stop.set()
+            skipped = [(index, NOT_STARTED if index not in started else CANCELLED)
+                       for index in range(len(items)) if index not in finished]
+        for index, reason in skipped:
+            yield items[index], False, reason
+    finally:
+        stop.set()
+
+
+def in_order(results, position, skip=()):
+    """Re-yield run_pipeline()'s (item, ok, result) entries in the order of position[item].
+
+    An entry is held back until every lower position has been yielded or is
+    in `skip` (positions with nothing coming, e.g. hosts not collected in this
+    run); failed, NOT_STARTED and CANCELLED entries release their position like
+    any other. Only what arrives ahead of its turn is kept, so keep results
+    small (e.g. already-formatted text). Anything still held when `results`
+    ends, because a lower position never came, follows in position order.
+    """
+    held = {index: [] for index in skip}
+    next_index = 0
+    for entry in results:
+        held.setdefault(position[entry[0]], []).append(entry)
+        while next_index in held:
+            yield from held.pop(next_index)
+            next_index += 1
+    for index in sorted(held):
+        yield from held[index]
+
+
+def longest_first(items, durations, workers):
+    """Order `items` longest expected duration first; returns (ordered, estimated seconds).
+
+    `durations` maps item -> expected seconds (None when unknown; those count as
+    the median of the known ones, or UNKNOWN_DURATION). The estimate is the
+    finishing time of the busiest of `workers` workers when each item goes to
+    whichever worker frees up first.
+    """
+    known = sorted(seconds for seconds in durations.values() if seconds is not None)
+    default = known[len(known) // 2] if known else UNKNOWN_DURATION
+    expected = {item: durations.get(item) if durations.get(item) is not None else default for item in items}
+    ordered = sorted(items, key=lambda item: expected[item], reverse=True)
+    loads = [0.0] * max(1, min(workers, len(ordered)))
+    for item in ordered:
+        heapq.heappush(loads, heapq.heappop(loads) + expected[item])
+    return ordered, max(loads)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+platform_cache.py
+
+Per-host session profiles kept on disk (platform_cache.json next to the
+scripts), so a run does not have to sniff the login banner to know what it is
+talking to. An entry is keyed by host name and records:
+
+    ip               the address it was learned on
+    platform         'cisco' / 'juniper'
+    prompt           CLI prompt after setup (e.g. 'SW1#', 'user@ex1>')
+    setup_commands   paging/CLI commands sent after login
+    source           'detected' (first contact) or 'netbox'
+    updated          timestamp of the last write
+
+Entries come from the first successful contact (SSHSession.profile()) or
+from NetBox (pull_hosts_from_netbox.py). An entry is dropped as soon as the
+host shows up in hosts.txt with a different IP.
+
+    cache = PlatformCache()
+    cache.sync_hosts(hosts)                 # [(ip, name), ...] from hosts.txt
+    profile = cache.get(name, ip)           # None -> detect on login
+    ...
+    cache.update(name, ip, session.profile())
+    cache.save()
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from ssh_session import SETUP_COMMANDS
+
+DEFAULT_CACHE = Path(__file__).parent / 'platform_cache.json'
+
+
+def platform_from_text(text):
+    """Map a NetBox platform/manufacturer string to 'cisco', 'juniper' or 'unknown'."""
+    low = (text or '').lower()
+    if 'juniper' in low or 'junos' in low:
+        return 'juniper'
+    if 'cisco' in low or 'ios' in low:
+        return 'cisco'
+    return 'unknown'
+
+
+class PlatformCache:
+    """Thread-safe view of platform_cache.json; call save() once the run is done."""
+
+    def __init__(self, path=DEFAULT_CACHE):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text())
+            except Exception as e:
+                print(f"Warning: ignoring unreadable {self.path}: {e}")
+
+    def sync_hosts(self, hosts):
+        """Drop entries whose IP no longer matches hosts.txt; `hosts` is [(ip, name), ...]."""
+        with self.lock:
+            for ip, name in hosts:
+                entry = self.entries.get(name)
+                if entry is not None and entry.get('ip') != ip:
+                    print(f"Platform cache: {name} moved {entry.get('ip')} -> {ip}, re-detecting")
+                    del self.entries[name]
+                    self.dirty = True
+
+    def get(self, name, ip):
+        """Cached profile for `name` at `ip`, or None."""
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or entry.get('ip') != ip or entry.get('platform') not in SETUP_COMMANDS:
+                return None
+            profile = dict(entry)
+        profile.setdefault('setup_commands', SETUP_COMMANDS[profile['platform']])
+        return profile
+
+    def update(self, name, ip, profile, source='detected'):
+        """Record a profile learned from a session; unknown platforms are not cached."""
+        if profile.get('platform') not in SETUP_COMMANDS:
+            return
+        entry = {'ip': ip, **profile, 'source': source,
+                 'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        with self.lock:
+            old = self.entries.get(name)
+            if old is not None and {k: v for k, v in old.items() if k != 'updated'} == \
+                    {k: v for k, v in entry.items() if k != 'updated'}:
+                return
+            self.entries[name] = entry
+            self.dirty = True
+
+    def seed(self, name, ip, platform, source='netbox'):
+        """Fill in a platform from an inventory source without overwriting a detected profile.
+
+        A profile detected on the same IP wins even if the inventory disagrees:
+        it is what the device itself said on login.
+        """
+        if platform not in SETUP_COMMANDS:
+            return
+        with self.lock:
+            old = self.entries.get(name)
+            if old is not None and old.get('ip') == ip and \
+                    (old.get('source') == 'detected' or old.get('platform') == platform):
+                return
+        self.update(name, ip, {'platform': platform, 'prompt': None,
+                               'setup_commands': SETUP_COMMANDS[platform]}, source=source)
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.entries, indent=2, sort_keys=True))
+            os.replace(tmp, self.path)
+            self.dirty = False
@@ -21,6 +21,7 @@ import os
 import sys
 import argparse
 import pynetbox
+from platform_cache import PlatformCache, platform_from_text
 
 def env(name: str, required=True):
     val = os.getenv(name)
@@ -153,6 +154,8 @@ def main():
                 return None
         return cur
 
+    # Platforms known to NetBox pre-fill the collectors' per-host session profiles
+    cache = PlatformCache()
     count = 0
     with open(out_filename, "w") as outf:
         for d in devices:
@@ -179,6 +182,11 @@ def main():
                 line += f" {manufacturer_name}"
             outf.write(line + "\n")
             count += 1
+            if ip_clean:
+                nb_platform = getattr(getattr(d, "platform", None), "name", "") or ""
+                nb_manufacturer = getattr(getattr(getattr(d, "device_type", None), "manufacturer", None), "name", "") or ""
+                cache.seed(name, ip_clean, platform_from_text(f"{nb_platform} {nb_manufacturer}"))
+    cache.save()
     print(f"Wrote {count} devices to {out_filename}")
 
 if __name__ == "__main__":
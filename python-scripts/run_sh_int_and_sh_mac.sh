@@ -19,6 +19,10 @@ if [ ! -x "$VENV_PY" ]; then
   fi
 fi
 
+# Overlapping runs: sh_int_and_sh_mac.py holds a per-site lock (run_lock.py). A copy
+# started while a run is in flight attaches to it when both are for the same slot and
+# otherwise leaves the collection to the next slot; pass --if-running to change that.
+# scheduler.py can replace the cron entries that start this wrapper and the compare/merge scripts.
 echo "Running $PY_SCRIPT at $(date -u) (UTC). Log: $LOG_FILE"
-"$VENV_PY" "$PY_SCRIPT" >>"$LOG_FILE" 2>&1 || rc=$?
+"$VENV_PY" "$PY_SCRIPT" "$@" >>"$LOG_FILE" 2>&1 || rc=$?
 exit ${rc:-0}
@@ -1,13 +1,14 @@
 #!/usr/bin/python3
-import re
 import csv
-import paramiko
 import sys
 from pathlib import Path
 from cryptography.fernet import Fernet
 from datetime import datetime
 import argparse
 import io
+from ssh_session import SSHSession
+from parsers import parse, INT_COMMAND
+from preflight import sweep, write_results, PROBE_TIMEOUT
 
 
 def main():
@@ -65,108 +66,43 @@ def main():
     # CLI args
     parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument('--debug', action='store_true', help='Write raw outputs and parse summaries to /tmp')
+    parser.add_argument('--no-preflight', action='store_true',
+                        help='Skip the TCP/22 reachability sweep and try SSH on every host')
+    parser.add_argument('--probe-timeout', type=float, default=PROBE_TIMEOUT,
+                        help=f'Seconds to wait for TCP/22 in the pre-flight sweep (default: {PROBE_TIMEOUT})')
     args, _ = parser.parse_known_args()
     DEBUG_MODE = bool(getattr(args, 'debug', False))
 
-    # ==== Regex pattern for interface description ====
-    int_pattern = re.compile(
-        r"^(?P<interface>\S+)\s+"
-        r"(?P<admin_status>\S+)\s+"
-        r"(?P<oper_status>\S+)"
-        r"(?:\s+(?P<description>.*))?$"
-    )
-
     all_data = []
 
-    for host_ip, host_name in hosts:
+    # Pre-flight: probe TCP/22 on every host at once; hosts that do not answer skip SSH
+    probes = {}
+    targets = hosts
+    if not args.no_preflight:
+        probes = sweep([ip for ip, _ in hosts], timeout=args.probe_timeout)
+        print(f"Pre-flight: {sum(p['reachable'] for p in probes.values())}/{len(probes)} hosts answer on tcp/22")
+        for host_ip, host_name in hosts:
+            if not probes[host_ip]['reachable']:
+                print(f"Failed to connect to {host_name}: tcp/22 unreachable ({probes[host_ip]['error']})")
+        targets = [(ip, hostname) for ip, hostname in hosts if probes[ip]['reachable']]
+
+    for host_ip, host_name in targets:
         print(f"\nConnecting to {host_name} ({host_ip})...")
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        session = SSHSession(host_ip, device_user, device_pass)
         try:
-            client.connect(
-                hostname=host_ip,
-                username=device_user,
-                password=device_pass,
-                look_for_keys=False,
-                allow_agent=False,
-                timeout=10
-            )
-            shell = client.invoke_shell()
-            shell.settimeout(2)
-            import time
-            time.sleep(1)
-            try:
-                banner = shell.recv(65535).decode('utf-8', errors='ignore')
-            except Exception:
-                banner = ''
-            is_juniper = False
-            is_cisco = False
-            low = banner.lower()
-            if 'junos' in low or 'juniper' in low:
-                is_juniper = True
-            elif 'ios' in low or 'cisco' in low or 'ios-xe' in low:
-                is_cisco = True
-
-            if is_cisco:
-                shell.send('terminal length 0\n')
-                shell.send('terminal width 511\n')
-                time.sleep(0.5)
-                try:
-                    shell.recv(65535)
-                except Exception:
-                    pass
-            if is_juniper:
-                shell.send('cli\n')
-                time.sleep(0.5)
-                try:
-                    shell.recv(65535)
-                except Exception:
-                    pass
-
-            shell.send('show interfaces description\n')
-            time.sleep(1)
-            int_output = ''
-            prompt_found = False
-            max_loops = 20
-            prompt_patterns = ['>', '#']
-            for _ in range(max_loops):
-                time.sleep(0.5)
-                try:
-                    chunk = shell.recv(65535).decode('utf-8')
-                except Exception:
-                    break
-                int_output += chunk
-                if '--More--' in chunk:
-                    shell.send(' ')
-                if any(chunk.strip().endswith(p) for p in prompt_patterns):
-                    prompt_found = True
-                    break
+            # Connects, detects the platform and disables paging / enters cli
+            session.open()
+            int_output, prompt_found = session.run(INT_COMMAND)
             if not prompt_found:
                 print(f"Warning: Prompt not detected for {host_name} (interfaces). Output may be incomplete.")
 
-            lines = int_output.splitlines()
-            for line in lines:
-                l = line.strip()
-                lowl = l.lower()
-                if not l or lowl.startswith('interface') or '--more--' in lowl or lowl.startswith('%') or lowl.startswith('show '):
-                    continue
-                cm = int_pattern.match(l)
-                if cm:
-                    data = cm.groupdict()
-                    if data['description'] is None:
-                        data['description'] = ''
-                    entry = {
-                        "host": host_name,
-                        "interface": data['interface'],
-                        "admin_status": data['admin_status'],
-                        "oper_status": data['oper_status'],
-                        "description": data['description']
-                    }
-                    all_data.append(entry)
+            # Parser chosen by platform from the shared registry
+            for row in parse(session.platform, INT_COMMAND, int_output):
+                all_data.append({"host": host_name, **row})
         except Exception as e:
             print(f"Failed to connect to {host_name}: {e}")
         finally:
-            client.close()
+            session.close()
 
     # ==== Write data to CSV with timestamp ====
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -179,6 +115,10 @@ def main():
             writer.writerow(row)
 
     print(f"\nData saved to {csv_filename}")
+    if probes:
+        probe_filename = csv_filename[:-len(".csv")] + "_preflight.csv"
+        write_results(probe_filename, [(hostname, ip) for ip, hostname in hosts], probes)
+        print(f"Pre-flight results saved to {probe_filename}")
 
 if __name__ == "__main__":
     main()
@@ -5,7 +5,11 @@ Run a show command on each host and save output to files.
 Defaults to: sh run | sec dhcp
 Saves outputs to ./outputs/<host>_<timestamp>.txt
 
+Hosts that do not answer a TCP/22 probe (preflight.py) are reported at once
+and not logged in to; --no-preflight tries SSH on every host.
+
 Usage: python3 sh_run_sec_dhcp.py [--command "sh run | sec dhcp"] [--outdir outputs] [--debug]
+                                  [--no-preflight] [--probe-timeout 2]
 """
 
 import argparse
@@ -13,7 +17,8 @@ import sys
 import time
 from pathlib import Path
 from cryptography.fernet import Fernet
-import paramiko
+from ssh_session import run_commands
+from preflight import sweep, PROBE_TIMEOUT
 
 
 def load_creds(base: Path):
@@ -56,32 +61,8 @@ def read_hosts(base: Path):
 
 def run_command_on_host(host_ip, host_name, user, pwd, command, outdir: Path, debug=False):
     print(f"Connecting to {host_name} ({host_ip})...")
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     try:
-        client.connect(hostname=host_ip, username=user, password=pwd, look_for_keys=False, allow_agent=False, timeout=10)
-        shell = client.invoke_shell()
-        shell.settimeout(2)
-        time.sleep(1)
-        try:
-            shell.recv(65535)
-        except Exception:
-            pass
-        shell.send(command + '\n')
-        time.sleep(0.5)
-        out = ''
-        prompt_patterns = ['>', '#']
-        for _ in range(120):
-            time.sleep(0.5)
-            try:
-                chunk = shell.recv(65535).decode('utf-8', errors='ignore')
-            except Exception:
-                break
-            out += chunk
-            if '--More--' in chunk:
-                shell.send(' ')
-            if any(chunk.strip().endswith(p) for p in prompt_patterns):
-                break
+        _, out, _ = run_commands(host_ip, user, pwd, [command])[0]
         ts = time.strftime('%Y%m%d_%H%M%S')
         outdir.mkdir(parents=True, exist_ok=True)
         fname = outdir / f"{host_name}_{ts}.txt"
@@ -92,11 +73,6 @@ def run_command_on_host(host_ip, host_name, user, pwd, command, outdir: Path, de
     except Exception as e:
         print(f"Failed {host_name}: {e}")
         return False
-    finally:
-        try:
-            client.close()
-        except Exception:
-            pass
 
 
 def main():
@@ -104,6 +80,9 @@ def main():
     parser.add_argument('--command', default='sh run | sec dhcp')
     parser.add_argument('--outdir', default='outputs')
     parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--no-preflight', action='store_true', help='Try SSH on every host, reachable or not')
+    parser.add_argument('--probe-timeout', type=float, default=PROBE_TIMEOUT,
+                        help=f'Seconds to wait for TCP/22 in the pre-flight sweep (default: {PROBE_TIMEOUT})')
     args = parser.parse_args()
 
     base = Path(__file__).parent
@@ -113,8 +92,12 @@ def main():
         sys.exit(2)
     hosts = read_hosts(base)
     outdir = base / args.outdir
+    probes = {} if args.no_preflight else sweep([ip for ip, _ in hosts], timeout=args.probe_timeout)
     success = 0
     for ip, name in hosts:
+        if ip in probes and not probes[ip]['reachable']:
+            print(f"Failed {name}: tcp/22 unreachable ({probes[ip]['error']})")
+            continue
         ok = run_command_on_host(ip, name, creds['device_user'], creds['device_pass'], args.command, outdir, debug=args.debug)
         if ok:
             success += 1
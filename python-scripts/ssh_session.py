@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+ssh_session.py
+
+Shared helpers for driving an interactive paramiko shell (invoke_shell) without
+fixed sleeps. The device prompt is learned from the login banner, and every
+command returns as soon as that prompt comes back, or when its deadline expires.
+
+Typical use:
+
+    shell = client.invoke_shell()
+    banner, prompt = learn_prompt(shell)
+    output, found = send_command(shell, 'show mac address-table', prompt)
+
+or, to run several commands over one login:
+
+    with SSHSession(ip, user, password) as session:
+        for command, output, stats in session.run_many(['show interfaces description',
+                                                         'show mac address-table']):
+            ...
+
+session.run_batch() takes the same list but writes every command in one go,
+each followed by a marker line, and splits the reply on the marker echoes.
+"""
+
+import codecs
+import re
+import select
+import time
+import paramiko
+
+# Characters a CLI prompt ends with: IOS/JunOS operational '>' / privileged or config '#',
+# JunOS/Unix shell '%' and '$'.
+PROMPT_CHARS = '>#%$'
+GENERIC_PROMPT_RE = re.compile(r'\S[^\r\n]*[' + re.escape(PROMPT_CHARS) + r']\s*$')
+PAGER_MARKERS = ('--More--', '---(more')
+RECV_SIZE = 65535
+DRAIN_QUIET = 0.5   # seconds without output after which a drained channel counts as empty
+# Marker line sent after each batched command. '!' starts a comment on IOS, so it
+# costs nothing there; run_batch() only batches on IOS.
+BATCH_MARKER = '! --batch-mark-{}--'
+# Commands that prepare the CLI after login: paging off on IOS, leave the shell for the CLI on JunOS
+SETUP_COMMANDS = {
+    'cisco': ['terminal length 0', 'terminal width 511'],
+    'juniper': ['cli'],
+}
+
+
+def last_line(text):
+    """Return the text after the final newline; a prompt is never followed by one."""
+    idx = max(text.rfind('\n'), text.rfind('\r'))
+    return text[idx + 1:]
+
+
+def prompt_regex(prompt):
+    """Build a regex matching `prompt` in any CLI mode of the same device.
+
+    'SW1#' also matches 'SW1(config)#' and 'SW1(config-if)#'; 'user@sw>' also
+    matches 'user@sw#' once in JunOS configure mode.
+    """
+    base = prompt.strip().rstrip(PROMPT_CHARS)
+    base = re.sub(r'\([^)]*\)$', '', base)
+    return re.compile(r'^' + re.escape(base) + r'(?:\([^)\r\n]*\))?[' + re.escape(PROMPT_CHARS) + r']\s*$')
+
+
+def wait_readable(shell, timeout):
+    """Block until the channel has data (or is closed) or `timeout` seconds pass."""
+    if timeout <= 0:
+        return shell.recv_ready()
+    readable, _, _ = select.select([shell], [], [], timeout)
+    return bool(readable)
+
+
+def read_until_prompt(shell, prompt=None, idle_timeout=10, max_time=None, stats=None, after=None, sink=None):
+    """Read from `shell` until the prompt is the last line of output.
+
+    `prompt` is the learned prompt string; with None any line ending in one of
+    PROMPT_CHARS is accepted. The deadline is based on progress: reading goes on
+    as long as bytes keep arriving and gives up only after `idle_timeout` seconds
+    of silence, so a large table is never cut off while it is still streaming.
+    `max_time` is an optional hard ceiling for the whole command.
+    '--More--' pagers are answered with a space. Returns (output, prompt_found).
+    With `after`, a prompt only counts once that text has been seen (used to
+    wait for the last marker of a batch).
+    With `sink` (e.g. parsers.stream_parser()), every chunk goes to
+    sink.feed() as it arrives and is not kept; the returned output is then
+    only the final line.
+
+    If `stats` is a dict it is filled with 'bytes', 'elapsed', 'prompt_found',
+    'idle' (True when the idle timeout ended the read) and 'max_gap', the
+    longest wait for bytes (first byte included).
+
+    Bytes are decoded incrementally, so a UTF-8 character split across two
+    reads is decoded whole instead of being dropped.
+    """
+    matcher = prompt_regex(prompt) if prompt else GENERIC_PROMPT_RE
+    pieces = []   # joined once at the end; repeated += would copy the whole output per chunk
+    tail = ''     # text after the last line break, where the prompt shows up
+    carry = ''    # end of the previous chunk, so `after` is found across a chunk boundary
+    nbytes = 0
+    found = False
+    idle = False
+    seen_after = after is None
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    start = time.monotonic()
+    last_progress = start
+    max_gap = 0.0
+    while True:
+        now = time.monotonic()
+        wait = last_progress + idle_timeout - now
+        if max_time is not None:
+            wait = min(wait, start + max_time - now)
+        if wait <= 0:
+            idle = now - last_progress >= idle_timeout
+            max_gap = max(max_gap, now - last_progress)
+            break
+        if not wait_readable(shell, wait):
+            continue
+        chunk = shell.recv(RECV_SIZE)
+        if not chunk:
+            # Channel closed by the device
+            found = bool(matcher.search(tail))
+            break
+        now = time.monotonic()
+        max_gap = max(max_gap, now - last_progress)
+        last_progress = now
+        nbytes += len(chunk)
+        text = decoder.decode(chunk)
+        if not text:
+            continue  # only part of a multi-byte character so far
+        if sink is not None:
+            sink.feed(text)
+        else:
+            pieces.append(text)
+        nl = max(text.rfind('\n'), text.rfind('\r'))
+        tail = text[nl + 1:] if nl >= 0 else tail + text
+        if any(m in text for m in PAGER_MARKERS):
+            shell.send(' ')
+            continue
+        if not seen_after:
+            seen_after = after in carry + text
+            carry = text[-len(after):]
+        if seen_after and matcher.search(tail):
+            found = True
+            break
+    if stats is not None:
+        stats.update({'bytes': nbytes, 'elapsed': time.monotonic() - start,
+                      'prompt_found': found, 'idle': idle, 'max_gap': max_gap})
+    return (''.join(pieces) if sink is None else tail), found
+
+
+def learn_prompt(shell, timeout=10):
+    """Read the login banner and return (banner, prompt).
+
+    The prompt is the last line the device prints once it is ready for input.
+    If nothing prompt-like arrives before `timeout`, prompt is None and callers
+    should fall back to generic prompt matching.
+    """
+    banner, found = read_until_prompt(shell, None, idle_timeout=timeout, max_time=timeout)
+    if not found:
+        return banner, None
+    return banner, last_line(banner).strip()
+
+
+def send_command(shell, command, prompt=None, idle_timeout=10, max_time=None, stats=None, sink=None):
+    """Send one command line and read its output up to the next prompt."""
+    shell.send(command + '\n')
+    if stats is not None:
+        stats['command'] = command
+    return read_until_prompt(shell, prompt, idle_timeout=idle_timeout, max_time=max_time, stats=stats, sink=sink)
+
+
+def split_batch(output, commands, markers):
+    """Split the combined output of a batch back into one output per command.
+
+    Each command's output runs from its echo up to the line holding the next
+    marker echo, so it looks like send_command() output without the trailing
+    prompt. Returns a list of (output, marker_found) in command order.
+    """
+    results = []
+    pos = 0
+    for command, marker in zip(commands, markers):
+        end = output.find(marker, pos)
+        if end < 0:
+            segment, found, next_pos = output[pos:], False, len(output)
+        else:
+            # Cut at the start of the marker line so its prompt stays out of the segment
+            line_start = max(output.rfind('\n', pos, end), output.rfind('\r', pos, end), pos - 1) + 1
+            segment, found = output[pos:line_start], True
+            next_pos = end + len(marker)
+        # Drop the prompt before the echo and anything the previous marker printed
+        echo = segment.find(command)
+        if echo >= 0:
+            segment = segment[echo:]
+        results.append((segment, found))
+        pos = next_pos
+    return results
+
+
+def format_stats(stats):
+    """One-line summary of a send_command() stats dict for the run log."""
+    state = 'ok' if stats.get('prompt_found') else ('idle timeout' if stats.get('idle') else 'incomplete')
+    return f"{stats.get('command', '?')}: {stats.get('bytes', 0)} bytes in {stats.get('elapsed', 0.0):.2f}s ({state})"
+
+
+def detect_platform(banner):
+    """Guess 'juniper', 'cisco' or 'unknown' from the login banner."""
+    low = banner.lower()
+    if 'junos' in low or 'juniper' in low:
+        return 'juniper'
+    if 'ios' in low or 'cisco' in low or 'ios-xe' in low:
+        return 'cisco'
+    return 'unknown'
+
+
+class SSHSession:
+    """One authenticated interactive shell to a device, reused for every command.
+
+    open() connects, learns the prompt, detects the platform and prepares the
+    CLI (paging off on Cisco, 'cli' on Juniper), so callers only send show
+    commands. Use it as a context manager or call close() when done.
+    With a cached `profile` (see platform_cache.py) the banner is not sniffed:
+    its platform and setup_commands are used as they are.
+    A command that ends without its prompt (idle timeout) is followed by
+    resync(), so its late output cannot end up in the next command's; if the
+    prompt does not come back the session is out of sync and run() raises.
+    """
+
+    def __init__(self, host_ip, user, password, connect_timeout=10, idle_timeout=10, keepalive=0, profile=None):
+        self.host_ip = host_ip
+        self.user = user
+        self.password = password
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.cached_profile = profile
+        self.client = None
+        self.shell = None
+        self.banner = ''
+        self.prompt = None
+        self.platform = 'unknown'
+        self.connect_time = None
+        self.in_sync = True
+
+    def open(self):
+        started = time.monotonic()
+        self.client = paramiko.SSHClient()
+        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.client.connect(
+            hostname=self.host_ip,
+            username=self.user,
+            password=self.password,
+            look_for_keys=False,
+            allow_agent=False,
+            timeout=self.connect_timeout
+        )
+        self.connect_time = time.monotonic() - started
+        if self.keepalive:
+            # Transport-level keepalives stop idle sessions being dropped by the device or firewalls
+            self.client.get_transport().set_keepalive(self.keepalive)
+        self.shell = self.client.invoke_shell()
+        self.shell.settimeout(2)
+        self.banner, self.prompt = learn_prompt(self.shell)
+        if self.cached_profile:
+            self.platform = self.cached_profile['platform']
+            setup_commands = self.cached_profile.get('setup_commands') or []
+        else:
+            self.platform = detect_platform(self.banner)
+            setup_commands = SETUP_COMMANDS.get(self.platform, [])
+        for command in setup_commands:
+            output, found = send_command(self.shell, command, None, idle_timeout=self.idle_timeout)
+            # 'cli' on JunOS replaces the shell prompt with the CLI one
+            self.prompt = last_line(output).strip() if found else None
+        if self.prompt is None and self.cached_profile:
+            self.prompt = self.cached_profile.get('prompt')
+        return self
+
+    def profile(self):
+        """The session profile to cache for the next run (see platform_cache.py)."""
+        return {'platform': self.platform, 'prompt': self.prompt,
+                'setup_commands': SETUP_COMMANDS.get(self.platform, [])}
+
+    def drain(self, quiet=DRAIN_QUIET):
+        """Discard whatever the device is still sending, until it has been quiet for `quiet` seconds.
+
+        With quiet=0 only what has already arrived is dropped, without waiting.
+        """
+        while wait_readable(self.shell, quiet):
+            if not self.shell.recv(RECV_SIZE):
+                break
+
+    def resync(self, idle_timeout=None):
+        """Get back to a clean prompt after a command that ended without one.
+
+        Sends an empty line, reads up to the prompt and drops everything read,
+        including the late tail of the previous command. Returns True when the
+        prompt came back; otherwise the session is marked out of sync.
+        """
+        if idle_timeout is None:
+            idle_timeout = self.idle_timeout
+        _, found = send_command(self.shell, '', self.prompt, idle_timeout=idle_timeout)
+        if found:
+            self.drain()
+        self.in_sync = found
+        return found
+
+    def run(self, command, idle_timeout=None, max_time=None, stats=None, sink=None):
+        """Run one command and return (output, prompt_found); see read_until_prompt() for `sink`."""
+        if idle_timeout is None:
+            idle_timeout = self.idle_timeout
+        if not self.in_sync:
+            raise RuntimeError(f"session to {self.host_ip} is out of sync after an incomplete command")
+        output, found = send_command(self.shell, command, self.prompt, idle_timeout=idle_timeout,
+                                     max_time=max_time, stats=stats, sink=sink)
+        if not found:
+            self.resync(idle_timeout)
+        return output, found
+
+    def run_many(self, commands, idle_timeout=None):
+        """Run each command in order; returns a list of (command, output, stats)."""
+        results = []
+        for command in commands:
+            stats = {}
+            output, _ = self.run(command, idle_timeout=idle_timeout, stats=stats)
+            results.append((command, output, stats))
+        return results
+
+    def run_batch(self, commands, idle_timeout=None):
+        """Like run_many(), but in one round trip.
+
+        All commands are written at once, each followed by a BATCH_MARKER
+        line, and the reply is read until the last marker's prompt comes back.
+        Only use it for show commands whose output can be read without a pager.
+        Batching needs IOS: paging is off there and the marker is a comment. On
+        any other platform (JunOS keeps its pager, which would eat the queued
+        lines as keystrokes) the commands run one by one through run_many().
+        """
+        commands = list(commands)
+        if not commands:
+            return []
+        if self.platform != 'cisco':
+            return self.run_many(commands, idle_timeout=idle_timeout)
+        if idle_timeout is None:
+            idle_timeout = self.idle_timeout
+        if not self.in_sync:
+            raise RuntimeError(f"session to {self.host_ip} is out of sync after an incomplete command")
+        markers = [BATCH_MARKER.format(i) for i in range(len(commands))]
+        self.shell.sendall(''.join(f"{command}\n{marker}\n" for command, marker in zip(commands, markers)))
+        batch_stats = {}
+        output, found = read_until_prompt(self.shell, self.prompt, idle_timeout=idle_timeout,
+                                          stats=batch_stats, after=markers[-1])
+        if not found:
+            self.resync(idle_timeout)
+        results = []
+        last = len(commands) - 1
+        for i, (segment, marker_found) in enumerate(split_batch(output, commands, markers)):
+            # 'elapsed' and 'idle' describe the whole batch
+            stats = dict(batch_stats, command=commands[i], bytes=len(segment.encode('utf-8')),
+                         prompt_found=marker_found and (found or i < last))
+            results.append((commands[i], segment, stats))
+        return results
+
+    def is_alive(self):
+        """True while the transport and the shell channel are both still open."""
+        if self.client is None or self.shell is None:
+            return False
+        transport = self.client.get_transport()
+        return bool(transport and transport.is_active()) and not self.shell.closed
+
+    def close(self):
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+        self.client = None
+        self.shell = None
+
+    def __enter__(self):
+        try:
+            return self.open()
+        except Exception:
+            self.close()
+            raise
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def run_commands(host_ip, user, password, commands, connect_timeout=10, idle_timeout=10):
+    """Open one session to `host_ip`, run all `commands` and close it.
+
+    Returns a list of (command, output, stats) in the order given.
+    """
+    with SSHSession(host_ip, user, password, connect_timeout=connect_timeout,
+                    idle_timeout=idle_timeout) as session:
+        return session.run_many(commands)